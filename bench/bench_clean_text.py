@@ -0,0 +1,131 @@
+"""Débit du nettoyage de texte: ancienne implémentation contre text_normalize
+
+    python bench/bench_clean_text.py                      # 20 000 mandats synthétiques
+    python bench/bench_clean_text.py mandats.json         # fichier réel (JSON ou JSONL)
+    python bench/bench_clean_text.py --mandats 100000 --repeat 3
+"""
+import argparse
+import html
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from text_normalize import _clean_memo, clean_pdf_text, clean_portal_text
+
+
+def legacy_clean_text(text):
+    """PortalScraper.clean_text avant text_normalize"""
+    if not isinstance(text, str):
+        return text
+    text = html.unescape(text)
+    for enc in ['utf-8', 'latin1', 'iso-8859-1']:
+        try:
+            text = text.encode(enc).decode('utf-8')
+            break
+        except:
+            continue
+    text = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def legacy_pdf_clean_text(text):
+    """PDFGenerator.clean_text avant text_normalize"""
+    char_mapping = [
+        ('\u2013', '-'), ('\u2014', '-'), ("'", "'"), ('"', '"'), ('"', '"'), ('\u2026', '...'),
+        ('\u2013', '-'), ('\u2014', '-'), ('\u2018', "'"), ('\u2019', "'"), ('\u201c', '"'),
+        ('\u201d', '"'), ('\u2022', '\u2022'), ('\u2026', '...'), ('\u00A0', ' '), ('\u202F', ' '),
+    ]
+    for old, new in char_mapping:
+        text = text.replace(old, new)
+    return text
+
+
+def clean_dict(data, clean):
+    if isinstance(data, dict):
+        return {key: clean_dict(value, clean) for key, value in data.items()}
+    if isinstance(data, list):
+        return [clean_dict(item, clean) for item in data]
+    return clean(data) if isinstance(data, str) else data
+
+
+def synthetic_mandats(count: int):
+    rng = random.Random(42)
+    words = ("génie mécanique conception analyse données équipe projet développement logiciel "
+             "Montréal Québec stage exigences compétences &amp; l&#39;entreprise rédaction "
+             "présentiel hybride télétravail").split()
+    # Quelques mandats mal décodés par le portail
+    mojibake = "dÃ©veloppement Ã©quipe lâ€™entreprise".split()
+    labels = ['Valide', 'Oui', 'Non', 'Hybride', 'Présentiel', 'Baccalauréat', 'Montréal', '4 mois']
+    for i in range(count):
+        yield {
+            'code_mandat': f"C-{i:06d}",
+            'titre_mandat': " ".join(rng.choices(words, k=6)),
+            'employeur': f"Employeur {i % 800}",
+            'etat_mandat': rng.choice(labels),
+            'mode_travail': rng.choice(labels),
+            'niveau_etudes': rng.choice(labels),
+            'lieu_travail': rng.choice(labels),
+            'description_mandat': " ".join(rng.choices(words if i % 50 else words + mojibake, k=150))
+                                  + "\n\n" + " ".join(rng.choices(words, k=80)),
+            'exigences_mandat': "\t".join(rng.choices(words, k=60)),
+        }
+
+
+def load_mandats(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def measure(label: str, fn, repeat: int, size: int, count: int):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<38} {best:7.3f}s  {count / best:>10,.0f} mandats/s  {size / best / 1e6:7.1f} Mo/s")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare les implémentations du nettoyage de texte")
+    parser.add_argument('fichier', nargs='?', help="mandats.json ou mandats.jsonl (sinon données synthétiques)")
+    parser.add_argument('--mandats', type=int, default=20000, help="Nombre de mandats synthétiques")
+    parser.add_argument('--repeat', type=int, default=3, help="Mesures par implémentation (meilleure retenue)")
+    args = parser.parse_args()
+
+    mandats = load_mandats(args.fichier) if args.fichier else list(synthetic_mandats(args.mandats))
+    size = len(json.dumps(mandats, ensure_ascii=False).encode('utf-8'))
+    letters = [mandat.get('description_mandat') or '' for mandat in mandats]
+    print(f"{len(mandats)} mandats, {size / 1e6:.1f} Mo\n")
+
+    def new_portal():
+        _clean_memo.cache_clear()
+        clean_dict(mandats, clean_portal_text)
+
+    legacy = measure("clean_dict (ancien clean_text)", lambda: clean_dict(mandats, legacy_clean_text),
+                     args.repeat, size, len(mandats))
+    new = measure("clean_dict (text_normalize, cache vide)", new_portal, args.repeat, size, len(mandats))
+    warm = measure("clean_dict (text_normalize, cache chaud)", lambda: clean_dict(mandats, clean_portal_text),
+                   args.repeat, size, len(mandats))
+    info = _clean_memo.cache_info()
+    print(f"  cache: {info.hits} succès, {info.misses} échecs, {info.currsize} entrées")
+    print(f"  accélération: x{legacy / new:.1f} (cache vide), x{legacy / warm:.1f} (cache chaud)\n")
+
+    letters_size = sum(len(text.encode('utf-8')) for text in letters)
+    legacy_pdf = measure("PDF (chaîne de replace)", lambda: [legacy_pdf_clean_text(t) for t in letters],
+                         args.repeat, letters_size, len(letters))
+    new_pdf = measure("PDF (text_normalize)", lambda: [clean_pdf_text(t) for t in letters],
+                      args.repeat, letters_size, len(letters))
+    print(f"  accélération: x{legacy_pdf / new_pdf:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Débit de l'extraction, mesuré sur le portail de test (mock/laruche_portal.py)
+
+    python bench/bench_crawl.py                                   # tous les modes, 200 mandats
+    python bench/bench_crawl.py --modes http http-direct --mandats 1000 --latency 0.05
+    python bench/bench_crawl.py --workers 4 --refus 0.1 --json resultats.json
+
+Modes:
+    selenium            un navigateur, un onglet par mandat (fetch_mode=selenium, workers=1)
+    selenium-parallele  pool de navigateurs headless (fetch_mode=selenium, workers=N)
+    http                liste par le navigateur, mandats en HTTP (fetch_mode=http, workers=N)
+    http-direct         connexion, liste et mandats en HTTP, sans navigateur
+
+Chaque mode tourne dans un sous-processus, dans un dossier de travail vide
+(mandats.jsonl et mandats.db neufs), pour que la RSS maximale lui soit propre.
+La RSS des navigateurs est celle du plus gros processus enfant terminé
+(Chrome, chromedriver), pas leur somme. Les modes selenium et http demandent Chrome.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urljoin
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+MODES = ('selenium', 'selenium-parallele', 'http', 'http-direct')
+RESULT_PREFIX = 'RESULTAT '
+
+CONFIG_TEMPLATE = """[credentials]
+username = banc
+password = essai
+
+[settings]
+headless = true
+wait_time = {wait_time}
+jobs_per_page = {jobs_per_page}
+workers = {workers}
+max_workers = {workers}
+fetch_mode = {fetch_mode}
+"""
+
+
+def make_scraper(url: str, fetch_mode: str, workers: int, jobs_per_page: int, wait_time: int):
+    """PortalScraper pointé sur le portail de test, dans le dossier de travail courant"""
+    from config.credentials import CredentialsManager
+    from src.main import PortalScraper
+
+    Path('config.ini').write_text(CONFIG_TEMPLATE.format(
+        wait_time=wait_time, jobs_per_page=jobs_per_page, workers=workers, fetch_mode=fetch_mode
+    ), encoding='utf-8')
+    return PortalScraper(CredentialsManager('config.ini'), login_url=url)
+
+
+def harvest_http(session, url: str):
+    """Connexion et parcours de la liste en HTTP; renvoie les liens comme harvest_links"""
+    import mandat_parser
+
+    tree = mandat_parser.parse_html(session.get(url).text)
+    form = tree.xpath("//form[.//input[@type='password']]")[0]
+    session.post(urljoin(url, form.get('action')), data={'username': 'banc', 'password': 'essai'})
+
+    links = []
+    page_url = url
+    while page_url:
+        tree = mandat_parser.parse_html(session.get(page_url).text)
+        for row in tree.xpath("//tr[.//a[contains(@href, 'mandat')]]"):
+            link = row.xpath(".//a[contains(@href, 'mandat')]")[0]
+            cells = [mandat_parser.element_text(cell) for cell in row.xpath("./td")]
+            link_data = {
+                'url': urljoin(page_url, link.get('href')),
+                'text': mandat_parser.element_text(link),
+                'code': cells[0] if cells else '',
+                'cells': cells,
+            }
+            link_data['fingerprint'] = mandat_parser.listing_fingerprint(link_data)
+            links.append(link_data)
+        next_links = tree.xpath("//a[@rel='next']/@href")
+        page_url = urljoin(page_url, next_links[0]) if next_links else None
+    return links
+
+
+def crawl_http_direct(scraper, url: str, workers: int):
+    import requests
+    from http_fetch import HttpMandatFetcher
+
+    session = requests.Session()
+    with scraper.timings.measure('listing'):
+        links = harvest_http(session, url)
+    cookies = [{'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path} for c in session.cookies]
+    session.close()
+
+    scraper.update_listing(links)
+    fetcher = HttpMandatFetcher(cookies, pool_size=workers)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for link_data, record in zip(links, executor.map(lambda l: scraper.fetch_http(fetcher, l), links)):
+                scraper.store_result(link_data, record)
+    finally:
+        fetcher.close()
+
+
+def run_mode(mode: str, url: str, workers: int, jobs_per_page: int, wait_time: int) -> dict:
+    """Exécute un mode dans le processus courant et renvoie ses mesures"""
+    fetch_mode = 'http' if mode.startswith('http') else 'selenium'
+    workers = 1 if mode == 'selenium' else workers
+    os.chdir(tempfile.mkdtemp(prefix='bench_crawl_'))
+    scraper = make_scraper(url, fetch_mode, workers, jobs_per_page, wait_time)
+
+    try:
+        if mode != 'http-direct':
+            scraper.setup_driver()
+            if not scraper.login():
+                raise RuntimeError("connexion au portail de test impossible")
+        start = time.perf_counter()
+        if mode == 'http-direct':
+            crawl_http_direct(scraper, url, workers)
+        elif not scraper.extract_mandats():
+            raise RuntimeError("extraction interrompue")
+        elapsed = time.perf_counter() - start
+    finally:
+        scraper.close()
+
+    # Durée par mandat: chargement HTTP ou navigateur, selon le chemin suivi
+    samples = sorted(scraper.timings.samples('http_fetch') + scraper.timings.samples('page_load'))
+
+    def percentile(q):
+        return samples[min(len(samples) - 1, int(round(q * (len(samples) - 1))))] if samples else 0.0
+
+    count = len(scraper.processed_mandats)
+    return {
+        'mode': mode,
+        'workers': workers,
+        'mandats': count,
+        'duree': elapsed,
+        'mandats_par_s': count / elapsed if elapsed else 0.0,
+        'p50': percentile(0.5),
+        'p95': percentile(0.95),
+        # ru_maxrss est en Kio sous Linux
+        'rss_max_mo': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'rss_enfants_mo': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        'etapes': scraper.timings.summary(),
+    }
+
+
+def child_main(args):
+    try:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(sys.stdout if args.verbeux else output):
+            result = run_mode(args.enfant, args.url, args.workers, args.jobs_per_page, args.wait_time)
+    except Exception as e:
+        # Les messages de Selenium tiennent sur plusieurs lignes: seule la première est gardée
+        message = (str(e).strip().splitlines() or [''])[0]
+        result = {'mode': args.enfant, 'erreur': f"{type(e).__name__}: {message}"}
+    print(RESULT_PREFIX + json.dumps(result, ensure_ascii=False))
+
+
+def run_child(mode: str, url: str, args) -> dict:
+    command = [sys.executable, __file__, '--enfant', mode, '--url', url, '--workers', str(args.workers),
+               '--jobs-per-page', str(args.jobs_per_page), '--wait-time', str(args.wait_time)]
+    if args.verbeux:
+        command.append('--verbeux')
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if args.verbeux:
+        print(completed.stdout, end='')
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    error = completed.stderr.strip().splitlines()[-1:] or [f"code de sortie {completed.returncode}"]
+    return {'mode': mode, 'erreur': error[0]}
+
+
+def print_results(results):
+    print(f"\n{'mode':<20} {'mandats':>7} {'durée':>8} {'mandats/s':>10} {'p50':>8} {'p95':>8} "
+          f"{'RSS max':>9} {'RSS nav.':>9}")
+    for result in results:
+        if 'erreur' in result:
+            print(f"{result['mode']:<20} échec: {result['erreur']}")
+            continue
+        print(f"{result['mode']:<20} {result['mandats']:>7} {result['duree']:>7.1f}s "
+              f"{result['mandats_par_s']:>10.1f} {result['p50'] * 1000:>6.0f}ms {result['p95'] * 1000:>6.0f}ms "
+              f"{result['rss_max_mo']:>6.0f} Mo {result['rss_enfants_mo']:>6.0f} Mo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure l'extraction des mandats sur le portail de test")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--mandats', type=int, default=200, help="Taille du catalogue du portail de test")
+    parser.add_argument('--latency', type=float, default=0.05, help="Durée minimale de chaque page (secondes)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Délai aléatoire ajouté à chaque page (secondes)")
+    parser.add_argument('--refus', type=float, default=0.05, help="Part des mandats dont l'accès est refusé")
+    parser.add_argument('--session-ttl', type=float, default=0.0,
+                        help="Durée de vie d'une session du portail de test (0: illimitée)")
+    parser.add_argument('--workers', type=int, default=4, help="Navigateurs ou connexions des modes parallèles")
+    parser.add_argument('--jobs-per-page', type=int, default=100, help="Lignes par page de la liste")
+    parser.add_argument('--wait-time', type=int, default=10)
+    parser.add_argument('--json', help="Enregistre les résultats dans ce fichier")
+    parser.add_argument('--verbeux', action='store_true', help="Affiche la sortie de l'extraction")
+    # Usage interne: exécution d'un mode dans le sous-processus
+    parser.add_argument('--enfant', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.enfant:
+        child_main(args)
+        return
+
+    from mock.laruche_portal import portal_url, start_server
+
+    server, stats = start_server(0, args.mandats, args.latency, args.jitter, args.refus,
+                                 session_ttl=args.session_ttl)
+    url = portal_url(server)
+    print(f"Portail de test: {args.mandats} mandats, latence {args.latency * 1000:.0f} ms, {url}")
+    results = []
+    try:
+        for mode in args.modes:
+            print(f"Mode {mode}...")
+            results.append(run_child(mode, url, args))
+    finally:
+        server.shutdown()
+
+    print_results(results)
+    print("Requêtes reçues: " + ", ".join(f"{kind}={count}" for kind, count in sorted(stats.items())))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'parametres': {key: value for key, value in vars(args).items()
+                                      if key not in ('enfant', 'url', 'json', 'verbeux')},
+                       'resultats': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,13 @@ import configparser
 from pathlib import Path
 
 class CredentialsManager:
-    def __init__(self):
+    def __init__(self, config_path=None):
+        self.config_path = Path(config_path) if config_path else Path(__file__).parent / 'config.ini'
         self.config = self._load_config()
 
     def _load_config(self):
         config = configparser.ConfigParser()
-        config_path = Path(__file__).parent / 'config.ini'
+        config_path = self.config_path
         
         if not config_path.exists():
             raise FileNotFoundError(f"Configuration file not found at {config_path}")
@@ -36,11 +37,17 @@ class CredentialsManager:
             raise KeyError(f"Missing URL in config file: {e}")
 
     def get_settings(self):
-        """Récupère les paramètres du fichier config.ini"""
+        """Récupère les paramètres du fichier config.ini (section [settings] optionnelle)"""
         try:
             return {
-                'wait_time': self.config['settings'].getint('wait_time'),
-                'jobs_per_page': self.config['settings'].getint('jobs_per_page')
+                'wait_time': self.config.getint('settings', 'wait_time', fallback=10),
+                'jobs_per_page': self.config.getint('settings', 'jobs_per_page', fallback=None),
+                'headless': self.config.getboolean('settings', 'headless', fallback=False),
+                'workers': self.config.getint('settings', 'workers', fallback=1),
+                'max_workers': self.config.getint('settings', 'max_workers', fallback=4),
+                'min_request_interval': self.config.getfloat('settings', 'min_request_interval', fallback=0.0),
+                'fetch_mode': self.config.get('settings', 'fetch_mode', fallback='selenium'),
+                'incremental': self.config.getboolean('settings', 'incremental', fallback=False)
             }
-        except KeyError as e:
-            raise KeyError(f"Missing setting in config file: {e}")
\ No newline at end of file
+        except ValueError as e:
+            raise ValueError(f"Invalid setting in config file: {e}")
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""État persistant d'un parcours du portail, pour reprendre après un arrêt
+
+Un parcours enregistre la file des mandats à extraire dès que la liste a été
+lue. Chaque mandat y passe de « en_attente » à « termine », ou à « echec »
+avec un nombre de tentatives. Un parcours interrompu (plantage de Chrome,
+session expirée, arrêt du processus) est repris au lancement suivant sans
+relire la liste: seuls les mandats non terminés sont extraits.
+"""
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from mandat_repository import connect
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawl_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    finished_at TEXT
+);
+CREATE TABLE IF NOT EXISTS crawl_queue (
+    run_id INTEGER NOT NULL,
+    code_mandat TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    link TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'en_attente',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, code_mandat)
+);
+CREATE INDEX IF NOT EXISTS idx_crawl_queue_status ON crawl_queue (run_id, status, position);
+"""
+
+EN_ATTENTE = 'en_attente'
+TERMINE = 'termine'
+ECHEC = 'echec'
+
+# Tentatives par mandat avant abandon
+MAX_ATTEMPTS = 3
+# Au-delà, la liste enregistrée est trop ancienne pour être reprise
+RESUME_MAX_AGE = timedelta(hours=24)
+
+
+class CrawlQueue:
+    """File des mandats d'un parcours, stockée dans mandats.db"""
+
+    def __init__(self, db_path: str = "mandats.db", max_attempts: int = MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self.conn = connect(db_path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def unfinished_run(self) -> Optional[int]:
+        """Parcours interrompu à reprendre; un parcours trop ancien est abandonné"""
+        row = self.conn.execute(
+            "SELECT id, started_at FROM crawl_runs WHERE finished_at IS NULL ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        if row is None:
+            return None
+        started_at = datetime.strptime(row['started_at'], '%Y-%m-%d %H:%M:%S')
+        if datetime.now() - started_at > RESUME_MAX_AGE:
+            print(f"Parcours n°{row['id']} du {row['started_at']} trop ancien, abandonné")
+            self.finish_run(row['id'])
+            return None
+        return row['id']
+
+    def start_run(self, links: List[Dict]) -> int:
+        """Enregistre la file des mandats à extraire et renvoie le numéro du parcours"""
+        now = time.strftime('%Y-%m-%d %H:%M:%S')
+        with self.conn:
+            # Un seul parcours en cours: un parcours précédent non repris est abandonné
+            self.conn.execute("UPDATE crawl_runs SET finished_at = ? WHERE finished_at IS NULL", (now,))
+            run_id = self.conn.execute("INSERT INTO crawl_runs (started_at) VALUES (?)", (now,)).lastrowid
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO crawl_queue (run_id, code_mandat, position, link, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (run_id, link_data['code'], position, json.dumps(link_data, ensure_ascii=False), now)
+                    for position, link_data in enumerate(links)
+                ]
+            )
+        return run_id
+
+    def pending(self, run_id: int) -> List[Dict]:
+        """Mandats du parcours encore à extraire, dans l'ordre de la liste"""
+        return [
+            json.loads(row['link']) for row in self.conn.execute(
+                "SELECT link FROM crawl_queue WHERE run_id = ? AND status != ? AND attempts < ? "
+                "ORDER BY position",
+                (run_id, TERMINE, self.max_attempts)
+            )
+        ]
+
+    def _set_status(self, run_id: int, code_mandat: str, status: str,
+                    error: Optional[str] = None, attempt: int = 0):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE crawl_queue SET status = ?, last_error = ?, attempts = attempts + ?, updated_at = ? "
+                "WHERE run_id = ? AND code_mandat = ?",
+                (status, error, attempt, time.strftime('%Y-%m-%d %H:%M:%S'), run_id, code_mandat)
+            )
+
+    def mark_done(self, run_id: int, code_mandat: str):
+        self._set_status(run_id, code_mandat, TERMINE)
+
+    def mark_failed(self, run_id: int, code_mandat: str, error: str):
+        """Compte une tentative échouée; le mandat sera réessayé jusqu'à max_attempts"""
+        self._set_status(run_id, code_mandat, ECHEC, error, attempt=1)
+
+    def progress(self, run_id: int) -> Dict[str, int]:
+        """Nombre de mandats par statut"""
+        return {
+            row['status']: row['count'] for row in self.conn.execute(
+                "SELECT status, COUNT(*) AS count FROM crawl_queue WHERE run_id = ? GROUP BY status", (run_id,)
+            )
+        }
+
+    def abandoned(self, run_id: int) -> List[str]:
+        """Mandats dont toutes les tentatives ont échoué"""
+        return [
+            row['code_mandat'] for row in self.conn.execute(
+                "SELECT code_mandat FROM crawl_queue WHERE run_id = ? AND status = ? AND attempts >= ? "
+                "ORDER BY position",
+                (run_id, ECHEC, self.max_attempts)
+            )
+        ]
+
+    def finish_run(self, run_id: int):
+        with self.conn:
+            self.conn.execute("UPDATE crawl_runs SET finished_at = ? WHERE id = ?",
+                              (time.strftime('%Y-%m-%d %H:%M:%S'), run_id))
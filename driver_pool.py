@@ -0,0 +1,131 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+from urllib.parse import urlsplit
+
+from selenium import webdriver
+
+# Champs acceptés par add_cookie (get_cookies en renvoie parfois d'autres)
+COOKIE_KEYS = ('name', 'value', 'path', 'domain', 'secure', 'httpOnly', 'expiry', 'sameSite')
+
+_DONE = object()
+
+
+class RequestThrottle:
+    """Espace les requêtes envoyées au portail, tous threads confondus"""
+
+    def __init__(self, min_interval: float = 0.0):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_request = 0.0
+
+    def wait_turn(self):
+        """Attend que min_interval secondes se soient écoulées depuis la requête précédente"""
+        if self.min_interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_request - now
+            self._next_request = max(now, self._next_request) + self.min_interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class PoolUnavailable(Exception):
+    """Aucun navigateur du pool n'a pu démarrer: les mandats n'ont pas été tentés"""
+
+
+class DriverPool:
+    """Pool de navigateurs headless partageant la session d'une seule connexion"""
+
+    def __init__(self, size: int, cookies: List[Dict], start_url: str,
+                 min_interval: float = 0.0, headless: bool = True):
+        self.size = size
+        self.cookies = cookies
+        parts = urlsplit(start_url)
+        self.origin_url = f"{parts.scheme}://{parts.netloc}/"
+        self.throttle = RequestThrottle(min_interval)
+        self.headless = headless
+        self.drivers = []
+        self._drivers_lock = threading.Lock()
+
+    def _create_driver(self):
+        """Démarre un navigateur et y copie les cookies de la session connectée"""
+        options = webdriver.ChromeOptions()
+        if self.headless:
+            options.add_argument('--headless=new')
+        options.add_argument('--window-size=1920,1080')
+        driver = webdriver.Chrome(options=options)
+
+        # Le navigateur doit être sur le domaine avant de recevoir les cookies
+        driver.get(self.origin_url)
+        for cookie in self.cookies:
+            cookie = {key: value for key, value in cookie.items() if key in COOKIE_KEYS}
+            try:
+                driver.add_cookie(cookie)
+            except Exception as e:
+                print(f"Cookie {cookie.get('name')} non copié: {e}")
+        return driver
+
+    def map(self, fn: Callable, items: Iterable[Dict]) -> Iterator[Tuple[Dict, object]]:
+        """Applique fn(driver, item) en parallèle et renvoie les résultats au fil de l'eau
+
+        Les résultats sont consommés par le thread appelant, qui reste ainsi
+        le seul à écrire sur disque. Lève PoolUnavailable si aucun navigateur
+        n'a pu démarrer.
+        """
+        tasks = queue.Queue()
+        for item in items:
+            tasks.put(item)
+        results = queue.Queue()
+
+        def worker():
+            try:
+                driver = self._create_driver()
+            except Exception as e:
+                print(f"Erreur lors du démarrage d'un navigateur du pool: {e}")
+                results.put(_DONE)
+                return
+            with self._drivers_lock:
+                self.drivers.append(driver)
+
+            while True:
+                try:
+                    item = tasks.get_nowait()
+                except queue.Empty:
+                    break
+                self.throttle.wait_turn()
+                try:
+                    result = fn(driver, item)
+                except Exception as e:
+                    print(f"Erreur dans un worker du pool: {str(e)}")
+                    result = None
+                results.put((item, result))
+            results.put(_DONE)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.size)]
+        for thread in threads:
+            thread.start()
+
+        finished = 0
+        while finished < len(threads):
+            result = results.get()
+            if result is _DONE:
+                finished += 1
+                continue
+            yield result
+
+        # Un seul navigateur démarré vide la file: il en reste seulement si aucun n'a démarré
+        if not tasks.empty():
+            raise PoolUnavailable(f"{tasks.qsize()} mandats non traités (aucun navigateur du pool n'a démarré)")
+
+    def close(self):
+        """Ferme tous les navigateurs du pool"""
+        with self._drivers_lock:
+            for driver in self.drivers:
+                try:
+                    driver.quit()
+                except Exception:
+                    pass
+            self.drivers = []
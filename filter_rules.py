@@ -0,0 +1,134 @@
+"""Règles de filtrage déclaratives, compilées en une seule requête SQL
+
+Chaque règle est un objet JSON {"champ": ..., "op": ..., "valeur": ...}:
+
+    egal / different            valeur unique
+    dans / hors                 liste de valeurs
+    contient / ne_contient_pas  liste de termes (sans tenir compte de la casse ni des accents)
+    jours_restants              {"min": 1, "max": 60} par rapport à aujourd'hui (date_limite)
+
+"si_absent": true retient les mandats pour lesquels le champ est vide.
+Le champ "_texte" désigne le titre, la description et les exigences du mandat.
+Toutes les règles doivent être satisfaites; la base évalue d'abord les
+colonnes indexées puis les champs du JSON, sur l'ensemble des mandats à la fois.
+"""
+import json
+import unicodedata
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from mandat_repository import ETAT_ACCES_REFUSE
+
+# Colonnes de la table mandats; les autres champs sont lus dans le JSON du mandat
+COLUMNS = {'code_mandat', 'titre_mandat', 'employeur', 'etat_mandat', 'postulation_laruche', 'date_limite'}
+TEXT_FIELDS = ('titre_mandat', 'description_mandat', 'exigences_mandat')
+OPERATORS = {'egal', 'different', 'dans', 'hors', 'contient', 'ne_contient_pas', 'jours_restants'}
+
+# Critères historiques: accès autorisé, postulation sur LaRuche, date limite non passée
+DEFAULT_RULES = [
+    {'champ': 'etat_mandat', 'op': 'different', 'valeur': ETAT_ACCES_REFUSE, 'si_absent': True},
+    {'champ': 'postulation_laruche', 'op': 'egal', 'valeur': 'Oui'},
+    {'champ': 'date_limite', 'op': 'jours_restants', 'valeur': {'min': 1}, 'si_absent': True},
+]
+
+
+@lru_cache(maxsize=65536)
+def fold(text: Optional[str]) -> str:
+    """Texte en minuscules et sans accents, pour les comparaisons de contenu"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def load_rules(path: str = "config/filtres.json") -> List[Dict]:
+    """Charge les règles du fichier de configuration, ou les critères historiques s'il n'existe pas"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        return list(DEFAULT_RULES)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Fichier de règles {path} invalide: {str(e)}")
+
+    rules = config.get('regles') if isinstance(config, dict) else config
+    if not isinstance(rules, list):
+        raise ValueError(f"Fichier de règles {path}: la clé 'regles' doit contenir une liste")
+    return rules
+
+
+class RuleCompiler:
+    """Traduit une liste de règles en clause WHERE paramétrée sur la table mandats"""
+
+    def __init__(self, today: Optional[date] = None):
+        self.today = today or date.today()
+
+    def field_sql(self, champ: str) -> str:
+        if champ in COLUMNS:
+            return champ
+        if champ == '_texte':
+            return "fold(" + " || ' ' || ".join(
+                f"coalesce(json_extract(data, '$.{field}'), '')" for field in TEXT_FIELDS
+            ) + ")"
+        if not champ.replace('_', '').isalnum():
+            raise ValueError(f"Nom de champ invalide: {champ}")
+        return f"json_extract(data, '$.{champ}')"
+
+    def compile_rule(self, rule: Dict) -> Tuple[str, List]:
+        champ = rule.get('champ')
+        op = rule.get('op')
+        valeur = rule.get('valeur')
+        if not champ or op not in OPERATORS:
+            raise ValueError(f"Règle invalide: {rule}")
+
+        field = self.field_sql(champ)
+        params = []
+        if op in ('egal', 'different'):
+            sql = f"{field} {'=' if op == 'egal' else '!='} ?"
+            params.append(valeur)
+        elif op in ('dans', 'hors'):
+            values = valeur if isinstance(valeur, list) else [valeur]
+            sql = f"{field} {'IN' if op == 'dans' else 'NOT IN'} (SELECT value FROM json_each(?))"
+            params.append(json.dumps(values, ensure_ascii=False))
+        elif op in ('contient', 'ne_contient_pas'):
+            terms = [fold(term) for term in (valeur if isinstance(valeur, list) else [valeur]) if term]
+            if not terms:
+                raise ValueError(f"Règle sans terme: {rule}")
+            folded = field if champ == '_texte' else f"fold({field})"
+            sql = "(" + " OR ".join(f"instr({folded}, ?) > 0" for _ in terms) + ")"
+            params.extend(terms)
+            if op == 'ne_contient_pas':
+                sql = f"NOT {sql}"
+        else:
+            if champ != 'date_limite':
+                raise ValueError("L'opérateur jours_restants ne s'applique qu'à date_limite")
+            bounds = valeur or {}
+            conditions = []
+            for key, comparison in (('min', '>='), ('max', '<=')):
+                if bounds.get(key) is not None:
+                    conditions.append(f"{field} {comparison} ?")
+                    params.append((self.today + timedelta(days=bounds[key])).isoformat())
+            sql = " AND ".join(conditions or ["1"])
+
+        if rule.get('si_absent'):
+            return f"({field} IS NULL OR {field} = '' OR ({sql}))", params
+        return f"({sql})", params
+
+    def compile(self, rules: List[Dict]) -> Tuple[str, List]:
+        """Clause WHERE complète; les règles sur colonnes indexées sont placées en premier"""
+        ordered = sorted(rules, key=lambda rule: rule.get('champ') not in COLUMNS)
+        clauses = []
+        params = []
+        for rule in ordered:
+            sql, rule_params = self.compile_rule(rule)
+            clauses.append(sql)
+            params.extend(rule_params)
+        return " AND ".join(clauses) or "1", params
+
+
+def find_mandats(repository, rules: List[Dict], today: Optional[date] = None) -> List[Dict]:
+    """Applique les règles à tous les mandats du dépôt en une requête"""
+    where, params = RuleCompiler(today).compile(rules)
+    repository.conn.create_function('fold', 1, fold, deterministic=True)
+    return repository.find_where(where, params)
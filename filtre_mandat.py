@@ -1,72 +1,60 @@
+import argparse
 import json
 from pathlib import Path
 import sys
-from datetime import datetime
+
+from mandat_store import MandatStore
+from mandat_repository import MandatRepository
+from filter_rules import find_mandats, load_rules
+from near_duplicates import NearDuplicateIndex
+import instrumentation
+from instrumentation import StageTimings
 
 class MandatFilter:
-    def __init__(self):
-        self.mandats_file = "mandats.json"
+    def __init__(self, rules_file: str = "config/filtres.json"):
+        self.store = MandatStore("mandats.jsonl")
+        self.store.migrate_from_json("mandats.json")
         self.filtered_file = "mandats_filtered.json"
+        self.repository = MandatRepository("mandats.db")
+        # Règles déclaratives; sans fichier, critères historiques (voir filter_rules.py)
+        self.rules = load_rules(rules_file)
+        self.duplicates = NearDuplicateIndex("mandats.db")
+        self.timings = StageTimings()
 
-    def load_mandats(self):
-        """Charge les mandats depuis le fichier JSON"""
-        try:
-            with open(self.mandats_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            print(f"Fichier {self.mandats_file} non trouvé")
-            return []
-        except json.JSONDecodeError:
-            print(f"Erreur de lecture du fichier {self.mandats_file}")
-            return []
+    def sync_repository(self):
+        """Importe dans la base SQLite les mandats ajoutés depuis le dernier filtrage"""
+        count = self.repository.sync_from_store(self.store)
+        if count:
+            print(f"{count} mandats importés dans {self.repository.db_path}")
+        duplicates = self.duplicates.sync()
+        if duplicates:
+            print(f"{duplicates} mandats quasi identiques à un mandat existant")
 
-    def filter_mandats(self, mandats):
-        """Filtre les mandats selon les critères"""
-        filtered_mandats = []
-        
-        for mandat in mandats:
-            try:
-                # Vérifier si le mandat est valide (pas d'accès refusé)
-                if mandat.get('etat_mandat') == 'Non valide - Accès refusé':
-                    continue
-                
-                # Vérifier si la postulation est sur LaRuche
-                if mandat.get('postulation_laruche') != 'Oui':
-                    continue
-                
-                # Vérifier si le mandat est toujours ouvert
-                date_limite_str = mandat.get('date_limite')
-                if date_limite_str:
-                    try:
-                        # Convertir la date limite en objet datetime
-                        date_limite = datetime.strptime(date_limite_str, '%d-%m-%Y')
-                        if date_limite < datetime.now():
-                            continue
-                    except ValueError:
-                        print(f"Format de date invalide pour le mandat {mandat.get('code_mandat')}: {date_limite_str}")
-                
-                # Si toutes les conditions sont remplies, ajouter le mandat à la liste filtrée
-                filtered_mandats.append(mandat)
-                
-            except Exception as e:
-                print(f"Erreur lors du filtrage du mandat {mandat.get('code_mandat')}: {str(e)}")
-                continue
-        
+    def filter_mandats(self):
+        """Filtre les mandats selon les règles configurées (une requête sur toute la base)"""
+        filtered_mandats = find_mandats(self.repository, self.rules)
+        # Les republications sont conservées mais signalées par le code du mandat d'origine
+        for mandat in filtered_mandats:
+            cluster = self.duplicates.cluster_of(mandat.get('code_mandat'))
+            if cluster and cluster != mandat.get('code_mandat'):
+                mandat['doublon_de'] = cluster
         return filtered_mandats
 
-    def save_filtered_mandats(self, filtered_mandats):
+    def save_filtered_mandats(self, filtered_mandats) -> bool:
         """Sauvegarde les mandats filtrés dans un nouveau fichier"""
         try:
             with open(self.filtered_file, 'w', encoding='utf-8') as f:
                 json.dump(filtered_mandats, f, ensure_ascii=False, indent=2)
             print(f"Mandats filtrés sauvegardés dans {self.filtered_file}")
+            return True
         except Exception as e:
             print(f"Erreur lors de la sauvegarde des mandats filtrés: {str(e)}")
+            return False
 
-    def print_summary(self, all_mandats, filtered_mandats):
+    def print_summary(self, total_count, filtered_mandats):
         """Affiche un résumé des résultats"""
         print("\nRésumé du filtrage :")
-        print(f"Nombre total de mandats : {len(all_mandats)}")
+        print(f"Nombre total de mandats : {total_count}")
         print(f"Nombre de mandats filtrés : {len(filtered_mandats)}")
         
         # Afficher les détails des mandats retenus
@@ -76,30 +64,47 @@ class MandatFilter:
             print(f"Titre: {mandat.get('titre_mandat')}")
             print(f"Date limite: {mandat.get('date_limite')}")
             print(f"Employeur: {mandat.get('employeur')}")
+            if mandat.get('doublon_de'):
+                print(f"Quasi identique au mandat: {mandat['doublon_de']}")
             print("-" * 50)
 
-    def run(self):
-        """Exécute le processus de filtrage"""
+    def run(self) -> bool:
+        """Exécute le processus de filtrage; renvoie False si les mandats filtrés n'ont pas été sauvegardés"""
         print("Début du filtrage des mandats...")
         
-        # Charger les mandats
-        all_mandats = self.load_mandats()
-        if not all_mandats:
+        # Mettre à jour la base avec les nouveaux mandats
+        with self.timings.measure('sync'):
+            self.sync_repository()
+        total_count = self.repository.count()
+        if not total_count:
             print("Aucun mandat à traiter")
-            return
+            return True
         
         # Filtrer les mandats
-        filtered_mandats = self.filter_mandats(all_mandats)
+        with self.timings.measure('filter', regles=len(self.rules)):
+            filtered_mandats = self.filter_mandats()
         
         # Sauvegarder les résultats
-        self.save_filtered_mandats(filtered_mandats)
+        with self.timings.measure('save'):
+            saved = self.save_filtered_mandats(filtered_mandats)
         
         # Afficher le résumé
-        self.print_summary(all_mandats, filtered_mandats)
+        self.print_summary(total_count, filtered_mandats)
+        self.timings.print_summary()
+        return saved
 
 def main():
-    filter = MandatFilter()
-    filter.run()
+    parser = argparse.ArgumentParser(description="Filtre les mandats selon les règles configurées")
+    parser.add_argument('--regles', default="config/filtres.json", help="Fichier JSON des règles de filtrage")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.setup(args)
+
+    filter = MandatFilter(rules_file=args.regles)
+    try:
+        filter.run()
+    finally:
+        instrumentation.finish(args, filter.timings, 'filtre')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,80 @@
+from typing import Callable, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import mandat_parser
+from driver_pool import RequestThrottle
+from session_manager import SessionExpired
+
+
+class HttpMandatFetcher:
+    """Récupère les pages de mandats en HTTP avec les cookies du navigateur connecté"""
+
+    def __init__(self, cookies: List[Dict], user_agent: Optional[str] = None,
+                 pool_size: int = 10, timeout: float = 15, throttle: Optional[RequestThrottle] = None):
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.throttle = throttle or RequestThrottle()
+        self.session = requests.Session()
+        # Génération de SessionManager dont les cookies sont chargés
+        self.session_generation = 0
+
+        # Connexions keep-alive réutilisées par tous les threads
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        self.load_cookies(cookies)
+
+    @classmethod
+    def from_driver(cls, driver, **kwargs) -> 'HttpMandatFetcher':
+        """Crée un client qui reprend la session d'un navigateur Selenium connecté"""
+        user_agent = driver.execute_script("return navigator.userAgent")
+        return cls(driver.get_cookies(), user_agent=user_agent, **kwargs)
+
+    def load_cookies(self, cookies: List[Dict]):
+        """Copie les cookies Selenium dans la session HTTP"""
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie['name'],
+                cookie['value'],
+                domain=cookie.get('domain', ''),
+                path=cookie.get('path', '/')
+            )
+
+    def fetch(self, link_data: Dict, clean_text: Callable[[str], str]) -> Optional[Dict]:
+        """Renvoie les données du mandat, ou None si la page doit passer par le navigateur
+
+        Lève SessionExpired si le portail renvoie la connexion: l'appelant se
+        reconnecte et recharge les cookies avant de réessayer.
+        """
+        self.throttle.wait_turn()
+        response = self.session.get(link_data['url'], timeout=self.timeout)
+        if response.status_code != 200:
+            print(f"Réponse HTTP {response.status_code} pour le mandat {link_data['code']}")
+            return None
+
+        # Sans charset explicite, requests suppose ISO-8859-1; le portail sert de l'UTF-8
+        if 'charset' not in response.headers.get('Content-Type', ''):
+            response.encoding = 'utf-8'
+
+        tree = mandat_parser.parse_html(response.text)
+        if mandat_parser.is_session_expired(tree):
+            raise SessionExpired(f"session expirée (mandat {link_data['code']})")
+
+        error_detected, ref_id = mandat_parser.detect_access_denied(tree)
+        if error_detected:
+            print(f"Accès refusé pour le mandat {link_data['code']}" + (f" (Ref.ID: {ref_id})" if ref_id else "") + " - marqué comme non valide")
+            return mandat_parser.access_denied_record(link_data, ref_id)
+
+        try:
+            return mandat_parser.extract_details(tree, response.url, clean_text)
+        except mandat_parser.UnexpectedLayout as e:
+            print(f"Structure inattendue pour le mandat {link_data['code']} ({e})")
+            return None
+
+    def close(self):
+        self.session.close()
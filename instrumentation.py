@@ -0,0 +1,299 @@
+"""Mesures du pipeline: durées par étape, journal JSON, export Prometheus et profilage
+
+Chaque étape mesurée (StageTimings.measure) est un span: sa durée alimente
+l'histogramme de l'étape et, si un journal est configuré, une ligne JSON est
+écrite avec l'identifiant du span, celui du span parent et le statut.
+
+    --log-json pipeline.jsonl     une ligne JSON par étape (ajoutée au fichier)
+    --metrics laruche.prom        histogrammes au format texte Prometheus en fin d'exécution
+    --profile [login,listing]     cProfile autour des étapes données (toutes sans valeur)
+"""
+import contextvars
+import cProfile
+import glob
+import io
+import itertools
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Bornes supérieures des classes de l'histogramme (secondes)
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+METRIC_NAME = 'laruche_stage_duration_seconds'
+PROFILE_DIR = 'profils'
+# Profils des processus de rendu, fusionnés par write_profiles dans le processus principal
+WORKER_PROFILE_DIR = os.path.join(PROFILE_DIR, 'workers')
+
+_log_file = None
+_log_lock = threading.Lock()
+_span_ids = itertools.count(1)
+_current_span = contextvars.ContextVar('span', default=None)
+
+# Un seul profileur actif à la fois: les spans imbriqués ou concurrents d'un
+# span déjà profilé sont comptés dans celui-ci
+_profile_stages = frozenset()
+_profilers: Dict[str, cProfile.Profile] = {}
+_profile_lock = threading.Lock()
+
+
+def configure(log_json: Optional[str] = None, profile: Optional[str] = None):
+    """Active le journal JSON et le profilage des étapes (« all » pour toutes)"""
+    global _log_file, _profile_stages
+    if log_json:
+        _log_file = open(log_json, 'a', encoding='utf-8', buffering=1)
+    if profile:
+        _profile_stages = frozenset(stage.strip() for stage in profile.split(',') if stage.strip())
+        # Profils laissés par les workers d'une exécution précédente
+        for path in glob.glob(os.path.join(WORKER_PROFILE_DIR, '*.prof')):
+            os.remove(path)
+
+
+def log_event(event: str, **fields):
+    """Écrit une ligne JSON dans le journal, s'il est configuré"""
+    if _log_file is None:
+        return
+    entry = {
+        'ts': datetime.now().isoformat(timespec='milliseconds'),
+        'event': event,
+        'pid': os.getpid(),
+        'thread': threading.current_thread().name,
+        **fields
+    }
+    line = json.dumps(entry, ensure_ascii=False, default=str)
+    with _log_lock:
+        _log_file.write(line + '\n')
+
+
+def _start_profile(stage: str) -> Optional[cProfile.Profile]:
+    if stage not in _profile_stages and 'all' not in _profile_stages:
+        return None
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = _profilers.get(stage)
+    if profiler is None:
+        profiler = _profilers[stage] = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _stop_profile(profiler: Optional[cProfile.Profile]):
+    if profiler is not None:
+        profiler.disable()
+        _profile_lock.release()
+
+
+@contextmanager
+def profile(stage: str):
+    """cProfile autour du bloc si l'étape est profilée, sans mesure ni journal
+
+    Utilisé dans les processus de rendu, dont la durée est enregistrée par le
+    processus principal.
+    """
+    profiler = _start_profile(stage)
+    try:
+        yield
+    finally:
+        _stop_profile(profiler)
+
+
+def save_worker_profiles(directory: str = WORKER_PROFILE_DIR):
+    """Enregistre les profils du processus courant (un worker) pour write_profiles"""
+    if not _profilers:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for stage, profiler in _profilers.items():
+        profiler.dump_stats(os.path.join(directory, f"{stage}.{os.getpid()}.prof"))
+
+
+def write_profiles(directory: str = PROFILE_DIR, top: int = 15):
+    """Enregistre un fichier .prof par étape profilée et affiche les fonctions les plus coûteuses
+
+    Les profils enregistrés par les workers (save_worker_profiles) sont
+    fusionnés avec celui du processus principal pour la même étape.
+    """
+    sources: Dict[str, list] = {stage: [profiler] for stage, profiler in _profilers.items()}
+    worker_files = glob.glob(os.path.join(directory, 'workers', '*.prof'))
+    for path in worker_files:
+        stage = os.path.basename(path).rsplit('.', 2)[0]
+        sources.setdefault(stage, []).append(path)
+    if not sources:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for stage, stage_sources in sources.items():
+        path = os.path.join(directory, f"{stage}.prof")
+        output = io.StringIO()
+        stats = pstats.Stats(*stage_sources, stream=output)
+        stats.dump_stats(path)
+        stats.sort_stats('cumulative').print_stats(top)
+        print(f"\nProfil de l'étape {stage} ({path}):")
+        print(output.getvalue().strip())
+    for path in worker_files:
+        os.remove(path)
+
+
+class StageTimings:
+    """Durées mesurées par étape, sous forme d'histogrammes (utilisable entre threads)
+
+    Les durées de la période en cours (résumé, percentiles) sont gardées une
+    à une et vidées par reset(); l'export Prometheus repose sur des compteurs
+    cumulés (classes, somme, nombre) de taille fixe, qui ne sont jamais vidés.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._samples: Dict[str, List[float]] = {}
+        # Par étape: nombre de mesures par classe, somme et nombre depuis le début
+        self._bucket_counts: Dict[str, List[int]] = {}
+        self._sums: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, **fields):
+        """Ajoute une durée à l'étape; les champs supplémentaires ne vont qu'au journal JSON"""
+        with self._lock:
+            self._samples.setdefault(stage, []).append(seconds)
+            counts = self._bucket_counts.setdefault(stage, [0] * len(self.buckets))
+            index = self._bucket(seconds)
+            if index is not None:
+                counts[index] += 1
+            self._sums[stage] = self._sums.get(stage, 0.0) + seconds
+        log_event('etape', etape=stage, duree=round(seconds, 6), **fields)
+
+    def _bucket(self, seconds: float) -> Optional[int]:
+        """Indice de la classe de la durée (None au-delà de la dernière borne)"""
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                return i
+        return None
+
+    def reset(self):
+        """Commence une nouvelle période (un cycle du démon); les compteurs cumulés sont conservés"""
+        with self._lock:
+            self._samples.clear()
+
+    @contextmanager
+    def measure(self, stage: str, **fields):
+        """Mesure la durée du bloc (un span) et l'ajoute à l'étape"""
+        span_id = f"{os.getpid()}-{next(_span_ids)}"
+        parent = _current_span.get()
+        token = _current_span.set(span_id)
+        profiler = _start_profile(stage)
+        status = 'ok'
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            status = 'erreur'
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            _stop_profile(profiler)
+            _current_span.reset(token)
+            self.record(stage, elapsed, span=span_id, parent=parent, statut=status, **fields)
+
+    def samples(self, stage: str) -> List[float]:
+        with self._lock:
+            return list(self._samples.get(stage, []))
+
+    def histogram(self, stage: str) -> List[int]:
+        """Nombre de mesures par classe de durée, sur la période en cours"""
+        counts = [0] * len(self.buckets)
+        for seconds in self.samples(stage):
+            index = self._bucket(seconds)
+            if index is not None:
+                counts[index] += 1
+        return counts
+
+    def percentile(self, stage: str, q: float) -> float:
+        samples = sorted(self.samples(stage))
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, int(round(q * (len(samples) - 1))))
+        return samples[index]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            stages = list(self._samples)
+        result = {}
+        for stage in stages:
+            samples = self.samples(stage)
+            result[stage] = {
+                'count': len(samples),
+                'total': sum(samples),
+                'p50': self.percentile(stage, 0.5),
+                'p95': self.percentile(stage, 0.95),
+                'max': max(samples)
+            }
+        return result
+
+    def prometheus_text(self, pipeline: str) -> str:
+        """Histogrammes au format d'exposition texte de Prometheus"""
+        lines = [
+            f"# HELP {METRIC_NAME} Durée des étapes du pipeline LaRuche",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        with self._lock:
+            totals = {stage: (list(counts), self._sums[stage]) for stage, counts in self._bucket_counts.items()}
+        for stage, (counts, total) in totals.items():
+            labels = f'pipeline="{pipeline}",stage="{stage}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{le}"}} {cumulative}')
+            if self.buckets[-1] != float('inf'):
+                lines.append(f'{METRIC_NAME}_bucket{{{labels},le="+Inf"}} {sum(counts)}')
+            lines.append(f"{METRIC_NAME}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{METRIC_NAME}_count{{{labels}}} {sum(counts)}")
+        lines += [
+            "# HELP laruche_last_run_timestamp_seconds Fin de la dernière exécution",
+            "# TYPE laruche_last_run_timestamp_seconds gauge",
+            f'laruche_last_run_timestamp_seconds{{pipeline="{pipeline}"}} {time.time():.0f}',
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str, pipeline: str):
+        """Écrit le fichier pour le collecteur textfile (remplacement atomique)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text(pipeline))
+        os.replace(tmp_path, path)
+
+    def print_summary(self):
+        """Affiche les durées par étape"""
+        summary = self.summary()
+        if not summary:
+            return
+        print("\nDurées par étape :")
+        for stage, stats in summary.items():
+            print(f"{stage:<15} n={stats['count']:<5} total={stats['total']:.1f}s "
+                  f"p50={stats['p50'] * 1000:.0f}ms p95={stats['p95'] * 1000:.0f}ms "
+                  f"max={stats['max'] * 1000:.0f}ms")
+            labels = ['≤' + (f"{bound}s" if bound != float('inf') else '∞') for bound in self.buckets]
+            counts = self.histogram(stage)
+            print("    " + "  ".join(f"{label}:{count}" for label, count in zip(labels, counts) if count))
+
+
+def add_arguments(parser):
+    """Options de mesure communes aux scripts du pipeline"""
+    parser.add_argument('--log-json', help="Journal JSON des étapes (une ligne par étape, ajoutée au fichier)")
+    parser.add_argument('--metrics', help="Fichier texte Prometheus écrit en fin d'exécution")
+    parser.add_argument('--profile', nargs='?', const='all',
+                        help="Profile les étapes données (séparées par des virgules) avec cProfile; toutes sans valeur")
+
+
+def setup(args):
+    configure(log_json=args.log_json, profile=args.profile)
+
+
+def finish(args, timings: StageTimings, pipeline: str):
+    """Exporte les métriques et les profils demandés en ligne de commande"""
+    if args.metrics:
+        timings.write_prometheus(args.metrics, pipeline)
+        print(f"Métriques écrites dans {args.metrics}")
+    write_profiles()
@@ -0,0 +1,220 @@
+"""Point d'entrée unique du pipeline LaRuche, sans intervention
+
+    python laruche.py crawl [--recommencer] [--visible]
+    python laruche.py filter [--regles config/filtres.json]
+    python laruche.py letters [--concurrency 8 --rps 5 --top-k 20]
+    python laruche.py pdf [--workers 4 --force]
+    python laruche.py all
+    python laruche.py daemon --interval 3600 [--etapes crawl,filter]
+
+Le mode démon exécute les étapes à intervalle régulier dans le même
+processus: le navigateur reste connecté (reconnexion seulement quand la
+session expire), le client HTTP garde ses connexions et les modules ne
+sont importés qu'une fois.
+"""
+import argparse
+import signal
+import sys
+import threading
+import time
+
+import instrumentation
+from instrumentation import StageTimings
+
+STAGES = ('crawl', 'filter', 'letters', 'pdf')
+
+
+class LaRuchePipeline:
+    """Étapes du pipeline; les objets coûteux à créer sont gardés d'un cycle à l'autre"""
+
+    def __init__(self, args):
+        self.args = args
+        self.timings = StageTimings()
+        self.scraper = None
+        self.mandat_filter = None
+        self.generator = None
+
+    def crawl(self) -> bool:
+        from src.main import PortalScraper
+
+        if self.scraper is None:
+            self.scraper = PortalScraper()
+            self.scraper.timings = self.timings
+            # Sans fenêtre sauf demande explicite: le pipeline tourne sans surveillance
+            self.scraper.settings['headless'] = not self.args.visible
+        self.scraper.resume = not self.args.recommencer
+        # Un seul --recommencer: les cycles suivants du démon reprennent normalement
+        self.args.recommencer = False
+        if self.scraper.driver is None:
+            self.scraper.setup_driver()
+        return self.scraper.crawl()
+
+    def filter(self) -> bool:
+        from filtre_mandat import MandatFilter
+
+        if self.mandat_filter is None:
+            self.mandat_filter = MandatFilter(rules_file=self.args.regles)
+            self.mandat_filter.timings = self.timings
+        return self.mandat_filter.run()
+
+    def get_generator(self):
+        from motivation_letter_gen import MotivationLetterGenerator
+
+        if self.generator is None:
+            self.generator = MotivationLetterGenerator(
+                api_url=self.args.api_url, use_cache=not self.args.no_cache,
+                top_k=self.args.top_k, min_score=self.args.min_score
+            )
+            self.generator.timings = self.timings
+        return self.generator
+
+    def letters(self) -> bool:
+        return self.get_generator().run(concurrency=self.args.concurrency, requests_per_second=self.args.rps)
+
+    def pdf(self) -> bool:
+        from pdf_gen import PDFGenerator
+
+        generator = PDFGenerator()
+        generator.timings = self.timings
+        return generator.generate_all_pdfs(workers=self.args.workers, force=self.args.force)
+
+    def letters_and_pdf(self) -> bool:
+        """Lettres et PDFs en flux: chaque lettre part au rendu dès qu'elle est générée"""
+        from letter_pipeline import LetterPipeline
+
+        return LetterPipeline(
+            self.get_generator(),
+            concurrency=self.args.concurrency,
+            requests_per_second=self.args.rps,
+            render_workers=self.args.workers
+        ).run()
+
+    def run(self, stages) -> bool:
+        """Exécute les étapes dans l'ordre; une étape en échec n'empêche pas les suivantes"""
+        steps = list(stages)
+        if 'letters' in steps and 'pdf' in steps:
+            steps[steps.index('letters')] = 'letters_and_pdf'
+            steps.remove('pdf')
+
+        success = True
+        for step in steps:
+            print(f"\n=== {step} ===")
+            try:
+                with self.timings.measure(f"etape_{step}"):
+                    ok = getattr(self, step)()
+            except Exception as e:
+                print(f"Erreur lors de l'étape {step}: {e}")
+                ok = False
+            success = success and ok
+        return success
+
+    def close(self):
+        if self.scraper is not None:
+            self.scraper.close()
+            self.scraper = None
+
+
+def run_daemon(pipeline: LaRuchePipeline, stages, interval: float) -> bool:
+    """Répète les étapes toutes les interval secondes jusqu'à SIGINT ou SIGTERM"""
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        if stop.is_set():
+            # Deuxième demande: arrêt immédiat
+            raise KeyboardInterrupt
+        print("\nArrêt demandé, fin après le cycle en cours")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    cycle = 0
+    while not stop.is_set():
+        cycle += 1
+        start = time.monotonic()
+        print(f"\n##### Cycle {cycle} ({time.strftime('%Y-%m-%d %H:%M:%S')}) #####")
+        # Résumés par cycle et mémoire bornée; les compteurs Prometheus restent cumulés
+        pipeline.timings.reset()
+        with pipeline.timings.measure('cycle', cycle=cycle):
+            ok = pipeline.run(stages)
+        print(f"Cycle {cycle} {'terminé' if ok else 'terminé avec des erreurs'} "
+              f"en {time.monotonic() - start:.0f}s")
+        if pipeline.args.metrics:
+            pipeline.timings.write_prometheus(pipeline.args.metrics, 'laruche')
+
+        delay = max(0.0, interval - (time.monotonic() - start))
+        if not stop.is_set() and delay:
+            print(f"Prochain cycle dans {delay:.0f}s")
+        stop.wait(delay)
+    return True
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    instrumentation.add_arguments(common)
+
+    crawl = argparse.ArgumentParser(add_help=False)
+    crawl.add_argument('--recommencer', action='store_true',
+                       help="Ignore le parcours interrompu et relit la liste des mandats")
+    crawl.add_argument('--visible', action='store_true', help="Affiche le navigateur (headless par défaut)")
+
+    filtering = argparse.ArgumentParser(add_help=False)
+    filtering.add_argument('--regles', default="config/filtres.json", help="Fichier JSON des règles de filtrage")
+
+    letters = argparse.ArgumentParser(add_help=False)
+    letters.add_argument('--concurrency', type=int, default=8, help="Nombre maximal de requêtes simultanées")
+    letters.add_argument('--rps', type=float, default=5.0, help="Débit maximal (requêtes par seconde)")
+    letters.add_argument('--api-url', help="URL de l'API de complétion (ex: serveur local de test)")
+    letters.add_argument('--no-cache', action='store_true', help="Ignorer le cache des réponses")
+    letters.add_argument('--top-k', type=int, help="Ne générer que pour les K mandats les plus pertinents")
+    letters.add_argument('--min-score', type=float, help="Score de pertinence minimal (0 à 1)")
+
+    pdf = argparse.ArgumentParser(add_help=False)
+    pdf.add_argument('--workers', type=int, default=2, help="Nombre de processus de rendu PDF")
+    pdf.add_argument('--force', action='store_true', help="Régénère tous les PDFs, même ceux déjà à jour")
+
+    every = [common, crawl, filtering, letters, pdf]
+    parser = argparse.ArgumentParser(description="Pipeline LaRuche: extraction, filtrage, lettres et PDFs")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('crawl', parents=[common, crawl], help="Extrait les mandats du portail")
+    commands.add_parser('filter', parents=[common, filtering], help="Filtre les mandats selon les règles")
+    commands.add_parser('letters', parents=[common, letters], help="Génère les lettres de motivation")
+    commands.add_parser('pdf', parents=[common, pdf], help="Génère les PDFs des lettres")
+    commands.add_parser('all', parents=every, help="Toutes les étapes, dans l'ordre")
+    daemon = commands.add_parser('daemon', parents=every, help="Toutes les étapes à intervalle régulier")
+    daemon.add_argument('--interval', type=float, default=3600, help="Secondes entre le début de deux cycles")
+    daemon.add_argument('--etapes', default=",".join(STAGES),
+                        help="Étapes de chaque cycle, séparées par des virgules")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    # Les étapes lisent toutes les options: celles absentes de la sous-commande
+    # prennent leur valeur par défaut (la sous-commande daemon les a toutes)
+    for key, value in vars(build_parser().parse_args(['daemon'])).items():
+        if not hasattr(args, key):
+            setattr(args, key, value)
+    instrumentation.setup(args)
+
+    pipeline = LaRuchePipeline(args)
+    try:
+        if args.command == 'daemon':
+            stages = [stage.strip() for stage in args.etapes.split(',') if stage.strip()]
+            unknown = [stage for stage in stages if stage not in STAGES]
+            if unknown:
+                print(f"Étapes inconnues: {', '.join(unknown)} (possibles: {', '.join(STAGES)})")
+                return 2
+            ok = run_daemon(pipeline, stages, args.interval)
+        elif args.command == 'all':
+            ok = pipeline.run(STAGES)
+        else:
+            ok = pipeline.run([args.command])
+    finally:
+        pipeline.close()
+        instrumentation.finish(args, pipeline.timings, 'laruche')
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterator, List, Optional
+
+import requests
+
+# États terminaux d'un lot
+FINAL_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+
+class BatchTransport(ABC):
+    """Interface d'envoi d'un lot de requêtes; à spécialiser selon le service"""
+
+    # Enregistré avec l'identifiant du lot: un lot n'est suivi que par le transport qui l'a soumis
+    name = ''
+
+    @abstractmethod
+    def submit(self, input_path: str) -> str:
+        """Envoie le fichier JSONL des requêtes et renvoie l'identifiant du lot"""
+
+    @abstractmethod
+    def status(self, batch_id: str) -> str:
+        """État du lot (voir FINAL_STATUSES pour les états terminaux)"""
+
+    @abstractmethod
+    def results(self, batch_id: str) -> Iterator[Dict]:
+        """Parcourt les lignes de résultat d'un lot terminé"""
+
+
+class OpenAIBatchTransport(BatchTransport):
+    """Transport utilisant l'API Batch d'OpenAI (fichier + lot traité sous 24 h)"""
+
+    name = 'openai'
+
+    def __init__(self, api_key: str, base_url: str = "https://api.openai.com/v1",
+                 endpoint: str = "/v1/chat/completions"):
+        self.base_url = base_url.rstrip('/')
+        self.endpoint = endpoint
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f"Bearer {api_key}"
+
+    def _check(self, response):
+        if response.status_code != 200:
+            raise Exception(f"Erreur API Batch ({response.status_code}): {response.text}")
+        return response
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, 'rb') as f:
+            upload = self._check(self.session.post(
+                f"{self.base_url}/files",
+                data={'purpose': 'batch'},
+                files={'file': (os.path.basename(input_path), f)}
+            )).json()
+        batch = self._check(self.session.post(f"{self.base_url}/batches", json={
+            'input_file_id': upload['id'],
+            'endpoint': self.endpoint,
+            'completion_window': '24h'
+        })).json()
+        return batch['id']
+
+    def _batch(self, batch_id: str) -> Dict:
+        return self._check(self.session.get(f"{self.base_url}/batches/{batch_id}")).json()
+
+    def status(self, batch_id: str) -> str:
+        return self._batch(batch_id)['status']
+
+    def results(self, batch_id: str) -> Iterator[Dict]:
+        batch = self._batch(batch_id)
+        for file_key in ('output_file_id', 'error_file_id'):
+            if not batch.get(file_key):
+                continue
+            content = self._check(self.session.get(f"{self.base_url}/files/{batch[file_key]}/content"))
+            for line in content.text.splitlines():
+                if line.strip():
+                    yield json.loads(line)
+
+
+class FakeBatchTransport(BatchTransport):
+    """Transport hors ligne: chaque requête reçoit immédiatement la réponse de responder"""
+
+    name = 'fake'
+
+    def __init__(self, responder: Optional[Callable[[Dict], Dict]] = None):
+        self.responder = responder or (lambda body: {
+            'choices': [{'message': {'role': 'assistant', 'content': 'Lettre de test'}}]
+        })
+        self.batches = {}
+
+    def submit(self, input_path: str) -> str:
+        batch_id = f"fake-batch-{len(self.batches) + 1}"
+        with open(input_path, 'r', encoding='utf-8') as f:
+            self.batches[batch_id] = [json.loads(line) for line in f if line.strip()]
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        return 'completed'
+
+    def results(self, batch_id: str) -> Iterator[Dict]:
+        for request in self.batches[batch_id]:
+            yield {
+                'custom_id': request['custom_id'],
+                'response': {'status_code': 200, 'body': self.responder(request['body'])},
+                'error': None
+            }
+
+
+class BatchLetterJob:
+    """Génération des lettres par lot: préparation, envoi, suivi puis fusion par code_mandat
+
+    L'identifiant du lot en cours est conservé dans state_file: une exécution
+    interrompue reprend le suivi du même lot au lieu d'en soumettre un autre.
+    """
+
+    def __init__(self, generator, transport: BatchTransport,
+                 input_file: str = "batch_lettres.jsonl", state_file: str = "batch_lettres_etat.json"):
+        self.generator = generator
+        self.transport = transport
+        self.input_file = input_file
+        self.state_file = state_file
+
+    def load_state(self) -> Optional[Dict]:
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save_state(self, state: Dict):
+        with open(self.state_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+
+    def write_requests(self, mandats: List[Dict]) -> int:
+        """Écrit le fichier JSONL du lot (une requête par mandat, custom_id = code_mandat)"""
+        with open(self.input_file, 'w', encoding='utf-8') as f:
+            for mandat in mandats:
+                f.write(json.dumps({
+                    'custom_id': mandat.get('code_mandat'),
+                    'method': 'POST',
+                    'url': '/v1/chat/completions',
+                    'body': self.generator.build_payload(mandat)
+                }, ensure_ascii=False) + '\n')
+        return len(mandats)
+
+    def submit(self, mandats: List[Dict]) -> Optional[str]:
+        """Prépare et envoie un lot pour les mandats sans lettre; les réponses en cache sont fusionnées directement"""
+        to_submit = []
+        cached_letters = []
+        for mandat in mandats:
+            response_data = self.generator.cached_response(self.generator.build_payload(mandat))
+            if response_data:
+                cached_letters.append(self.generator.letter_from_response(mandat, response_data))
+            else:
+                to_submit.append(mandat)
+
+        if cached_letters:
+            self.generator.merge_letters(cached_letters)
+            print(f"{len(cached_letters)} lettres reprises du cache")
+
+        if not to_submit:
+            return None
+
+        self.write_requests(to_submit)
+        batch_id = self.transport.submit(self.input_file)
+        self.save_state({
+            'batch_id': batch_id,
+            'transport': self.transport.name,
+            'submitted_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'codes': [mandat.get('code_mandat') for mandat in to_submit]
+        })
+        print(f"Lot {batch_id} soumis ({len(to_submit)} requêtes)")
+        return batch_id
+
+    def wait(self, batch_id: str, poll_interval: float = 60) -> str:
+        """Attend la fin du lot"""
+        while True:
+            status = self.transport.status(batch_id)
+            if status in FINAL_STATUSES:
+                return status
+            print(f"Lot {batch_id}: {status}, nouvelle vérification dans {poll_interval:.0f}s")
+            time.sleep(poll_interval)
+
+    def merge(self, batch_id: str, mandats_by_code: Dict[str, Dict]) -> int:
+        """Fusionne les résultats du lot dans les lettres (idempotent par code_mandat)"""
+        letters = []
+        for result in self.transport.results(batch_id):
+            code = result.get('custom_id')
+            response = result.get('response') or {}
+            mandat = mandats_by_code.get(code)
+            if mandat is None:
+                continue
+            if response.get('status_code') != 200:
+                error = result.get('error') or response.get('body')
+                print(f"Échec de la requête du lot pour le mandat {code}: {error}")
+                continue
+            payload = self.generator.build_payload(mandat)
+            self.generator.cache_response(payload, response['body'])
+            letters.append(self.generator.letter_from_response(mandat, response['body']))
+
+        self.generator.merge_letters(letters)
+        return len(letters)
+
+    def run(self, mandats: List[Dict], poll_interval: float = 60) -> int:
+        mandats_by_code = {mandat.get('code_mandat'): mandat for mandat in mandats}
+
+        state = self.load_state()
+        if state and state.get('transport') != self.transport.name:
+            # Un lot d'un autre transport (ex: factice) n'existe pas pour celui-ci
+            print(f"Le lot {state['batch_id']} de {self.state_file} a été soumis avec le transport "
+                  f"« {state.get('transport', 'inconnu')} », pas « {self.transport.name} »: "
+                  f"suivi impossible, supprimer {self.state_file} pour soumettre un nouveau lot")
+            return 0
+        if state:
+            batch_id = state['batch_id']
+            print(f"Reprise du suivi du lot {batch_id}")
+        else:
+            batch_id = self.submit(mandats)
+            if batch_id is None:
+                print("Aucune requête à soumettre")
+                return 0
+
+        status = self.wait(batch_id, poll_interval)
+        count = 0
+        if status == 'completed':
+            count = self.merge(batch_id, mandats_by_code)
+            print(f"Lot {batch_id} terminé: {count} lettres fusionnées")
+        else:
+            print(f"Lot {batch_id} terminé avec l'état {status}")
+
+        if os.path.exists(self.state_file):
+            os.remove(self.state_file)
+        return count
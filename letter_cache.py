@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class LetterCache:
+    """Cache disque des réponses de l'API, indexé par l'empreinte de la requête
+
+    La clé couvre l'URL de l'API, le modèle, le prompt système et le contenu
+    du mandat: une requête identique à une exécution précédente ne coûte
+    aucun appel, et les réponses d'un serveur de test ne sont jamais
+    servies à la place de celles de l'API réelle.
+    """
+
+    def __init__(self, directory: str = "cache_lettres", max_bytes: int = 200 * 1024 * 1024,
+                 max_age_days: float = 90):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 24 * 3600
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(payload: Dict, api_url: str = '') -> str:
+        """Empreinte SHA-256 de la requête et de l'API appelée, sous forme canonique"""
+        canonical = json.dumps({'api_url': api_url, 'payload': payload},
+                               ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.max_age:
+                path.unlink()
+                self.evictions += 1
+                self.misses += 1
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+
+        # La date de modification sert d'horodatage d'accès pour l'éviction
+        os.utime(path)
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: Dict):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.writes += 1
+
+    def evict(self) -> int:
+        """Supprime les entrées trop anciennes puis les moins récemment utilisées au-delà de max_bytes"""
+        if not self.directory.exists():
+            return 0
+
+        now = time.time()
+        entries = []
+        removed = 0
+        for path in self.directory.glob('*/*.json'):
+            stat = path.stat()
+            if now - stat.st_mtime > self.max_age:
+                path.unlink()
+                removed += 1
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink()
+            total -= size
+            removed += 1
+
+        self.evictions += removed
+        return removed
+
+    def print_stats(self):
+        lookups = self.hits + self.misses
+        ratio = self.hits / lookups * 100 if lookups else 0
+        print(f"Cache des lettres: {self.hits} succès, {self.misses} échecs ({ratio:.0f}%), "
+              f"{self.writes} écritures, {self.evictions} évictions")
@@ -0,0 +1,173 @@
+import asyncio
+import random
+import re
+import time
+from contextlib import nullcontext
+from typing import Dict, Optional
+
+import httpx
+
+# Statuts pour lesquels la requête est réessayée
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+RESET_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+class CompletionError(Exception):
+    """Échec définitif d'un appel à l'API de complétion"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Convertit '20ms', '1s', '6m0s' ou '2.5' (en-têtes de limite) en secondes"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r'([\d.]+)(ms|h|m|s)', value)
+    if not parts:
+        return None
+    return sum(float(amount) * RESET_UNITS[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """Seau à jetons dont le débit s'adapte aux en-têtes x-ratelimit-* et aux 429"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, min_rate: float = 0.05):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """Attend qu'un jeton soit disponible"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def observe(self, headers):
+        """Ajuste le débit d'après les limites restantes annoncées par l'API"""
+        remaining_tokens = headers.get('x-ratelimit-remaining-tokens')
+        reset_tokens = parse_duration(headers.get('x-ratelimit-reset-tokens'))
+        if remaining_tokens is not None and float(remaining_tokens) <= 0 and reset_tokens:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + reset_tokens)
+
+        remaining = headers.get('x-ratelimit-remaining-requests')
+        reset = parse_duration(headers.get('x-ratelimit-reset-requests'))
+        if remaining is not None and reset:
+            # Répartir les requêtes restantes sur la fenêtre de la limite
+            self.rate = min(self.max_rate, max(self.min_rate, float(remaining) / reset))
+        else:
+            # Augmentation additive après un succès
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+    def backoff(self, delay: float):
+        """Après un 429: pause commune à toutes les requêtes et débit divisé par deux"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+
+
+class AsyncCompletionClient:
+    """Client asynchrone de l'API de complétion (connexions keep-alive, concurrence bornée)
+
+    Avec timings (StageTimings), chaque requête HTTP est mesurée dans l'étape
+    api_call et l'attente d'une place (concurrence, débit) dans api_wait; les
+    pauses entre deux tentatives ne comptent dans aucune des deux.
+    """
+
+    def __init__(self, api_url: str, api_key: str, concurrency: int = 8,
+                 requests_per_second: float = 5.0, max_retries: int = 6,
+                 timeout: float = 180.0, base_delay: float = 1.0, max_delay: float = 60.0,
+                 timings=None):
+        self.api_url = api_url
+        self.timings = timings
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(requests_per_second)
+        self.client = httpx.AsyncClient(
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {api_key}"
+            },
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        )
+
+    def retry_delay(self, attempt: int, headers=None, status_code: Optional[int] = None) -> float:
+        """Délai avant la prochaine tentative (en-tête du serveur ou backoff exponentiel avec gigue)
+
+        La fin de la fenêtre de limite (x-ratelimit-reset-requests) ne vaut que
+        pour un 429: une erreur serveur n'attend que retry-after ou le backoff.
+        """
+        if headers is not None:
+            delay = parse_duration(headers.get('retry-after'))
+            if not delay and status_code == 429:
+                delay = parse_duration(headers.get('x-ratelimit-reset-requests'))
+            if delay:
+                return delay + random.uniform(0, min(1.0, delay / 2))
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _measure(self, stage: str, **fields):
+        return self.timings.measure(stage, **fields) if self.timings is not None else nullcontext()
+
+    async def complete(self, payload: Dict, **fields) -> Dict:
+        """Envoie une requête de complétion et renvoie la réponse JSON
+
+        Les champs supplémentaires (ex: code_mandat) accompagnent les mesures dans le journal.
+        """
+        wait_start = time.perf_counter()
+        async with self.semaphore:
+            for attempt in range(self.max_retries + 1):
+                await self.bucket.acquire()
+                if self.timings is not None:
+                    self.timings.record('api_wait', time.perf_counter() - wait_start, **fields)
+                try:
+                    with self._measure('api_call', tentative=attempt + 1, **fields):
+                        response = await self.client.post(self.api_url, json=payload)
+                except httpx.TransportError as e:
+                    error = CompletionError(f"Erreur réseau: {e}")
+                    delay = self.retry_delay(attempt)
+                else:
+                    self.bucket.observe(response.headers)
+                    if response.status_code == 200:
+                        return response.json()
+
+                    error = CompletionError(f"Erreur API ({response.status_code}): {response.text}",
+                                            response.status_code)
+                    if response.status_code not in RETRY_STATUSES:
+                        raise error
+                    delay = self.retry_delay(attempt, response.headers, response.status_code)
+                    if response.status_code == 429:
+                        self.bucket.backoff(delay)
+
+                if attempt == self.max_retries:
+                    raise error
+                await asyncio.sleep(delay)
+                wait_start = time.perf_counter()
+
+    async def aclose(self):
+        await self.client.aclose()
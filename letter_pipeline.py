@@ -0,0 +1,155 @@
+import argparse
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import instrumentation
+from letter_client import AsyncCompletionClient
+from motivation_letter_gen import MotivationLetterGenerator
+from pdf_gen import PDFGenerator, init_render_worker, render_letter
+
+_STOP = object()
+
+
+class LetterPipeline:
+    """Génération des lettres et rendu PDF en flux
+
+    Chaque lettre terminée passe directement au rendu par une file bornée:
+    quand le rendu prend du retard, les workers de génération attendent
+    avant de prendre un nouveau mandat. La durée totale tend vers celle
+    de l'étape la plus lente au lieu de la somme des étapes.
+    """
+
+    def __init__(self, generator: MotivationLetterGenerator, concurrency: int = 8, requests_per_second: float = 5.0,
+                 render_workers: int = 2, queue_size: int = 16):
+        self.generator = generator
+        self.concurrency = concurrency
+        self.requests_per_second = requests_per_second
+        self.render_workers = render_workers
+        self.queue_size = queue_size
+        # Mêmes mesures que le générateur: les appels à l'API (api_call) y sont enregistrés
+        self.timings = generator.timings
+        self.pdf_generator = PDFGenerator()
+        self.pdf_generator.timings = self.timings
+        self.manifest = {}
+        self.generated = 0
+        self.rendered = 0
+
+    async def produce(self, client: AsyncCompletionClient, mandats: List[Dict], queue: asyncio.Queue):
+        """Worker de génération: un mandat à la fois, bloqué tant que la file est pleine"""
+        while mandats:
+            mandat = mandats.pop()
+            start = time.perf_counter()
+            letter = await self.generator.generate_letter_async(client, mandat)
+            self.timings.record('generation', time.perf_counter() - start)
+            if not letter:
+                continue
+
+            self.generator.save_letter(letter)
+            self.generated += 1
+            await queue.put((letter, time.perf_counter()))
+
+    async def consume(self, queue: asyncio.Queue, executor: ProcessPoolExecutor):
+        """Worker de rendu: transforme chaque lettre reçue en PDF"""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await queue.get()
+            if item is _STOP:
+                return
+            letter, queued_at = item
+            self.timings.record('queue_wait', time.perf_counter() - queued_at)
+            if self.pdf_generator.is_up_to_date(self.manifest, letter):
+                continue
+
+            try:
+                pdf_path, seconds = await loop.run_in_executor(executor, render_letter, letter)
+                self.timings.record('render', seconds, code_mandat=letter.get('code_mandat'))
+            except Exception as e:
+                print(f"Erreur du worker de rendu pour le mandat {letter.get('code_mandat')}: {str(e)}")
+                pdf_path = None
+            if pdf_path:
+                self.pdf_generator.record_pdf(self.manifest, letter, pdf_path)
+                self.rendered += 1
+                print(f"PDF créé avec succès: {pdf_path}")
+
+    async def run_async(self, mandats: List[Dict]):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        client = AsyncCompletionClient(
+            self.generator.api_url,
+            self.generator.api_key,
+            concurrency=self.concurrency,
+            requests_per_second=self.requests_per_second,
+            timings=self.timings
+        )
+        remaining = list(reversed(mandats))
+        executor = ProcessPoolExecutor(max_workers=self.render_workers, initializer=init_render_worker)
+        try:
+            consumers = [asyncio.create_task(self.consume(queue, executor)) for _ in range(self.render_workers)]
+            producers = [asyncio.create_task(self.produce(client, remaining, queue)) for _ in range(self.concurrency)]
+            await asyncio.gather(*producers)
+            for _ in consumers:
+                await queue.put(_STOP)
+            await asyncio.gather(*consumers)
+        finally:
+            await client.aclose()
+            executor.shutdown()
+
+    def run(self) -> bool:
+        """Génère et rend les lettres; renvoie False si une lettre ou un PDF a échoué
+
+        Les lettres qui ne passent pas par la file (reprises d'un doublon,
+        rendu échoué ou PDF manquant d'une exécution précédente) sont rendues
+        ensuite par generate_all_pdfs; le manifeste écarte celles déjà à jour.
+        """
+        print("Début du pipeline lettres + PDF...")
+        mandats = self.generator.select_mandats()
+        print(f"Nombre de mandats à traiter: {len(mandats)}")
+
+        start = time.perf_counter()
+        self.manifest = self.pdf_generator.load_manifest()
+        try:
+            asyncio.run(self.run_async(mandats))
+        finally:
+            self.pdf_generator.save_manifest(self.manifest)
+            exported = self.generator.export_letters()
+
+        print("\nPDFs des autres lettres sans PDF à jour...")
+        rendered = self.pdf_generator.generate_all_pdfs(workers=self.render_workers, print_summary=False)
+
+        print(f"\nPipeline terminé en {time.perf_counter() - start:.1f}s: "
+              f"{self.generated} lettres, {self.rendered} PDFs en flux")
+        self.generator.finish_cache()
+        self.timings.print_summary()
+        # Un rendu en échec dans la file est retenté par generate_all_pdfs
+        return exported and self.generated == len(mandats) and rendered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère les lettres et leurs PDFs en flux")
+    parser.add_argument('--concurrency', type=int, default=8, help="Nombre maximal de requêtes simultanées")
+    parser.add_argument('--rps', type=float, default=5.0, help="Débit maximal (requêtes par seconde)")
+    parser.add_argument('--render-workers', type=int, default=2, help="Nombre de workers de rendu PDF")
+    parser.add_argument('--queue-size', type=int, default=16, help="Lettres en attente de rendu avant blocage")
+    parser.add_argument('--api-url', help="URL de l'API de complétion (ex: serveur local de test)")
+    parser.add_argument('--top-k', type=int, help="Ne générer que pour les K mandats les plus pertinents")
+    parser.add_argument('--min-score', type=float, help="Score de pertinence minimal (0 à 1)")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.setup(args)
+
+    pipeline = LetterPipeline(
+        MotivationLetterGenerator(api_url=args.api_url, top_k=args.top_k, min_score=args.min_score),
+        concurrency=args.concurrency,
+        requests_per_second=args.rps,
+        render_workers=args.render_workers,
+        queue_size=args.queue_size
+    )
+    try:
+        pipeline.run()
+    finally:
+        instrumentation.finish(args, pipeline.timings, 'pipeline_lettres')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import json
+import os
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from mandat_repository import connect
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lettres (
+    code_mandat TEXT PRIMARY KEY,
+    employeur TEXT,
+    data TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class LetterStore:
+    """Lettres de motivation indexées par code_mandat (une lettre par mandat)
+
+    Chaque sauvegarde est un upsert SQLite en mode WAL: son coût ne dépend pas
+    du nombre de lettres déjà générées et un mandat relancé remplace sa lettre
+    au lieu de créer un doublon.
+    """
+
+    def __init__(self, db_path: str = "mandats.db", legacy_json: Optional[str] = "lettres_motivation.json"):
+        self.db_path = db_path
+        self.conn = connect(db_path)
+        self.conn.executescript(SCHEMA)
+        if legacy_json:
+            self.migrate_from_json(legacy_json)
+
+    def close(self):
+        self.conn.close()
+
+    def upsert(self, letter: Dict, commit: bool = True) -> bool:
+        code = letter.get('code_mandat')
+        if not code:
+            return False
+
+        self.conn.execute(
+            """
+            INSERT INTO lettres (code_mandat, employeur, data, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(code_mandat) DO UPDATE SET
+                employeur = excluded.employeur,
+                data = excluded.data,
+                updated_at = excluded.updated_at
+            """,
+            (
+                code,
+                letter.get('employeur'),
+                json.dumps(letter, ensure_ascii=False),
+                time.strftime('%Y-%m-%d %H:%M:%S'),
+            ),
+        )
+        if commit:
+            self.conn.commit()
+        return True
+
+    def upsert_many(self, letters: Iterable[Dict]) -> int:
+        """Insère ou remplace plusieurs lettres dans une seule transaction"""
+        count = 0
+        with self.conn:
+            for letter in letters:
+                if self.upsert(letter, commit=False):
+                    count += 1
+        return count
+
+    def get(self, code_mandat: str) -> Optional[Dict]:
+        row = self.conn.execute(
+            "SELECT data FROM lettres WHERE code_mandat = ?", (code_mandat,)
+        ).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM lettres").fetchone()[0]
+
+    def iter_all(self) -> Iterator[Dict]:
+        for row in self.conn.execute("SELECT data FROM lettres ORDER BY rowid"):
+            yield json.loads(row['data'])
+
+    def pending(self, mandats: List[Dict]) -> List[Dict]:
+        """Mandats sans lettre, dans leur ordre d'origine (une seule requête indexée)"""
+        codes = [mandat.get('code_mandat') for mandat in mandats if mandat.get('code_mandat')]
+        existing = {
+            row[0] for row in self.conn.execute(
+                "SELECT code_mandat FROM lettres WHERE code_mandat IN (SELECT value FROM json_each(?))",
+                (json.dumps(codes, ensure_ascii=False),)
+            )
+        }
+        return [mandat for mandat in mandats if mandat.get('code_mandat') not in existing]
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """Importe une seule fois l'ancien fichier de lettres (la dernière lettre d'un mandat l'emporte)"""
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'lettres_json_importees'").fetchone():
+            return 0
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                letters = json.load(f)
+        except FileNotFoundError:
+            letters = []
+        except json.JSONDecodeError:
+            print(f"Erreur de lecture du fichier {json_path}, migration impossible")
+            return 0
+
+        with self.conn:
+            codes = set()
+            for letter in letters:
+                if isinstance(letter, dict) and self.upsert(letter, commit=False):
+                    codes.add(letter['code_mandat'])
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('lettres_json_importees', ?)",
+                (json_path,)
+            )
+        if codes:
+            print(f"{len(codes)} lettres migrées de {json_path} vers {self.db_path}")
+        return len(codes)
+
+    def export_json(self, json_path: str) -> int:
+        """Écrit toutes les lettres dans un fichier JSON lisible (remplacement atomique)"""
+        letters = list(self.iter_all())
+        tmp_path = json_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(letters, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, json_path)
+        return len(letters)
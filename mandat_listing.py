@@ -0,0 +1,132 @@
+from typing import Dict, List
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+import page_ready
+
+# Nombre maximal de pages parcourues (protection contre une pagination qui boucle)
+MAX_PAGES = 500
+
+# Boutons « page suivante » des rapports APEX (classique, interactif, grille)
+NEXT_PAGE_SELECTORS = [
+    "a.t-Report-paginationLink--next",
+    "button.a-IRR-button--pagination[title='Suivant']",
+    "button.a-IRR-button--pagination[title='Next']",
+    "button.a-GV-pageButton[data-action='next']",
+    "a[rel='next']",
+]
+
+# Toutes les lignes de la page en un seul appel: code, lien, titre et colonnes
+HARVEST_SCRIPT = """
+var rows = document.querySelectorAll('tr');
+var out = [];
+for (var i = 0; i < rows.length; i++) {
+    var link = rows[i].querySelector("a[href*='mandat']");
+    if (!link) { continue; }
+    var cells = [];
+    var tds = rows[i].querySelectorAll(':scope > td');
+    for (var j = 0; j < tds.length; j++) { cells.push(tds[j].innerText.trim()); }
+    out.push({href: link.href, text: link.innerText, cells: cells});
+}
+return out;
+"""
+
+# Choisit la plus grande taille de page disponible sans dépasser la valeur
+# demandée, dans un sélecteur dont toutes les options sont numériques
+ROWS_PER_PAGE_SCRIPT = """
+var wanted = arguments[0];
+var selects = document.querySelectorAll('select');
+for (var i = 0; i < selects.length; i++) {
+    var select = selects[i];
+    var values = [];
+    for (var j = 0; j < select.options.length; j++) {
+        var value = parseInt(select.options[j].value, 10);
+        if (isNaN(value) || String(value) !== select.options[j].value.trim()) { values = []; break; }
+        values.push(value);
+    }
+    if (values.length < 2) { continue; }
+    var best = null;
+    for (var k = 0; k < values.length; k++) {
+        if (values[k] <= wanted && (best === null || values[k] > best)) { best = values[k]; }
+    }
+    if (best === null) { best = Math.min.apply(null, values); }
+    if (parseInt(select.value, 10) === best) { return best; }
+    if (window.apex && apex.jQuery) {
+        apex.jQuery(select).val(String(best)).trigger('change');
+    } else {
+        select.value = String(best);
+        select.dispatchEvent(new Event('change', {bubbles: true}));
+    }
+    return best;
+}
+return null;
+"""
+
+NEXT_PAGE_SCRIPT = """
+var selectors = arguments[0];
+for (var i = 0; i < selectors.length; i++) {
+    var button = document.querySelector(selectors[i]);
+    if (!button || button.disabled || button.getAttribute('aria-disabled') === 'true') { continue; }
+    if (button.offsetParent === null) { continue; }
+    button.click();
+    return true;
+}
+return false;
+"""
+
+# La page suivante est affichée quand la première ligne a changé et que
+# le rapport a fini de se rafraîchir
+PAGE_CHANGED_SCRIPT = """
+if (window.apex && apex.jQuery && apex.jQuery.active > 0) { return false; }
+if (document.querySelector('.u-Processing')) { return false; }
+var link = document.querySelector("tr a[href*='mandat']");
+if (!link) { return false; }
+var cell = link.closest('tr').querySelector(':scope > td');
+return (cell ? cell.innerText.trim() : '') !== arguments[0];
+"""
+
+
+def harvest_rows(driver) -> List[Dict]:
+    """Renvoie les liens des mandats affichés sur la page courante"""
+    links = []
+    for row in driver.execute_script(HARVEST_SCRIPT) or []:
+        cells = row.get('cells') or []
+        if not row.get('href') or not row.get('text'):
+            continue
+        links.append({
+            'url': row['href'],
+            'text': row['text'],
+            'code': cells[0] if cells else '',
+            'cells': cells
+        })
+    return links
+
+
+def set_rows_per_page(driver, rows_per_page: int, timeout: float):
+    """Demande la plus grande taille de page possible; renvoie la taille retenue"""
+    selected = driver.execute_script(ROWS_PER_PAGE_SCRIPT, rows_per_page)
+    if selected is not None:
+        page_ready.wait_for_listing(driver, timeout)
+    return selected
+
+
+class ListingIncomplete(Exception):
+    """La liste n'a pas pu être lue jusqu'à sa dernière page"""
+
+
+def goto_next_page(driver, first_code: str, timeout: float) -> bool:
+    """Affiche la page suivante; renvoie False s'il n'y en a pas
+
+    Lève ListingIncomplete si la page suivante ne se charge pas: les pages
+    non lues ne doivent pas être prises pour des mandats retirés.
+    """
+    if not driver.execute_script(NEXT_PAGE_SCRIPT, NEXT_PAGE_SELECTORS):
+        return False
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=page_ready.POLL_INTERVAL).until(
+            lambda d: d.execute_script(PAGE_CHANGED_SCRIPT, first_code)
+        )
+        return True
+    except TimeoutException:
+        raise ListingIncomplete("la page suivante de la liste ne s'est pas chargée")
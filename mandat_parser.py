@@ -0,0 +1,181 @@
+import hashlib
+import json
+import time
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urljoin
+
+import lxml.html
+
+# Correspondance champ -> libellé affiché sur la page d'un mandat
+FIELDS = {
+    'etat_mandat': 'État du mandat',
+    'date_limite': 'Date limite pour postuler',
+    'employeur': 'Employeur',
+    'description_employeur': 'Description de l\'employeur',
+    'site_web': 'Site Web',
+    'lieu_travail': 'Lieu du travail',
+    'mode_travail': 'Mode de travail',
+    'precisions_mode_travail': 'Précisions sur le mode de travail',
+    'code_mandat': 'Code du mandat',
+    'debut_mandat': 'Début du mandat',
+    'duree': 'Durée',
+    'possibilite_prolongation': 'Possibilité de prolongation',
+    'titre_mandat': 'Titre du mandat',
+    'description_mandat': 'Description du mandat',
+    'exigences_mandat': 'Exigences du mandat',
+    'niveau_etudes': 'Niveau d\'études requis',
+    'specialites': 'Spécialités'
+}
+
+# Éléments caractéristiques de la postulation sur LaRuche
+LARUCHE_XPATHS = [
+    "//div[contains(text(), 'Le document doit être en format .PDF')]",
+    "//label[contains(text(), 'Choisir un CV')]",
+    "//label[contains(text(), 'Choisir une lettre')]"
+]
+
+# Éléments caractéristiques d'une postulation externe
+EXTERNAL_XPATHS = [
+    "//div[contains(text(), 'Instruction de postulation')]"
+]
+
+# Le libellé est passé en variable XPath pour supporter les apostrophes
+VALUE_XPATH = "//label[contains(text(), $label)]/../..//span[contains(@class, 'display_only')]"
+ALT_VALUE_XPATH = "//label[contains(text(), $label)]/../following-sibling::div//span"
+SITE_WEB_XPATH = "//label[contains(text(), 'Site Web')]/../following-sibling::div//a"
+
+ETAT_ACCES_REFUSE = 'Non valide - Accès refusé'
+
+# Messages de la page affichée par APEX quand la session a expiré
+SESSION_EXPIRED_TEXTS = ('session a expiré', 'session est expirée', 'Your session has ended', 'session has expired')
+
+BLOCK_TAGS = {'br', 'p', 'div', 'li', 'ul', 'ol', 'tr', 'h1', 'h2', 'h3', 'h4'}
+
+
+class UnexpectedLayout(Exception):
+    """La page ne correspond pas à la structure attendue d'un mandat"""
+
+
+def parse_html(html: str):
+    """Construit l'arbre lxml d'une page"""
+    return lxml.html.fromstring(html)
+
+
+def _collect_text(node, parts):
+    if not isinstance(node.tag, str):
+        # Commentaires et instructions de traitement
+        return
+    if node.tag in BLOCK_TAGS:
+        parts.append('\n')
+    if node.text:
+        parts.append(node.text)
+    for child in node:
+        _collect_text(child, parts)
+        if child.tail:
+            parts.append(child.tail)
+
+
+def element_text(element) -> str:
+    """Équivalent approximatif d'innerText: les éléments de bloc deviennent des sauts de ligne"""
+    parts = []
+    _collect_text(element, parts)
+    return ''.join(parts).strip()
+
+
+def is_login_page(tree) -> bool:
+    """Vrai si le portail a renvoyé la page de connexion"""
+    return bool(tree.xpath("//input[@type='password']"))
+
+
+def is_session_expired(tree) -> bool:
+    """Vrai si le portail a renvoyé la connexion ou la page d'expiration de session"""
+    if is_login_page(tree):
+        return True
+    return any(tree.xpath("//*[contains(text(), $text)]", text=text) for text in SESSION_EXPIRED_TEXTS)
+
+
+def detect_access_denied(tree) -> Tuple[bool, Optional[str]]:
+    """Détecte la page d'accès refusé; renvoie (erreur détectée, Ref.ID)"""
+    # Méthode 1: Chercher le titre h3
+    for error_h3 in tree.xpath("//h3[contains(text(), 'avez pas accès')]"):
+        text = element_text(error_h3)
+        return True, text.split("Ref.ID:")[-1].strip() if "Ref.ID:" in text else None
+
+    # Méthode 2: Chercher la div d'alerte
+    for error_div in tree.xpath("//*[contains(concat(' ', normalize-space(@class), ' '), ' t-Alert--danger ')]"):
+        text = element_text(error_div)
+        if "Ref.ID:" in text:
+            return True, text.split("Ref.ID:")[-1].split("\n")[0].strip()
+        return True, None
+
+    # Méthode 3: Chercher par le texte exact
+    if tree.xpath("//*[contains(text(), 'Accès refusé par le contrôle de sécurité')]"):
+        return True, None
+
+    return False, None
+
+
+def access_denied_record(link_data: Dict, ref_id: Optional[str] = None) -> Dict:
+    """Données sauvegardées pour un mandat dont l'accès est refusé"""
+    error_data = {
+        'code_mandat': link_data['code'],
+        'titre_mandat': link_data['text'],
+        'url': link_data['url'],
+        'etat_mandat': ETAT_ACCES_REFUSE,
+        'date_verification': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+    if ref_id:
+        error_data['ref_id'] = ref_id
+
+    error_data['message_erreur'] = 'Accès refusé par le contrôle de sécurité de la page'
+    return error_data
+
+
+def listing_fingerprint(link_data: Dict) -> str:
+    """Empreinte d'une ligne de la liste (code, titre et colonnes visibles)"""
+    content = [link_data['code'], link_data['text'], link_data.get('cells', [])]
+    return hashlib.sha1(json.dumps(content, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def extract_after_label(tree, label: str) -> str:
+    """Valeur affichée à côté d'un libellé"""
+    for xpath in (VALUE_XPATH, ALT_VALUE_XPATH):
+        elements = tree.xpath(xpath, label=label)
+        if elements:
+            return element_text(elements[0])
+    return ''
+
+
+def extract_details(tree, url: str, clean_text: Callable[[str], str]) -> Dict:
+    """Extrait les détails d'un mandat à partir de l'arbre de la page"""
+    if not tree.xpath("//label[contains(text(), $label)]", label=FIELDS['code_mandat']):
+        raise UnexpectedLayout("libellé 'Code du mandat' introuvable")
+
+    details = {}
+
+    # Vérifier si la postulation est sur LaRuche
+    is_laruche = any(tree.xpath(xpath) for xpath in LARUCHE_XPATHS)
+    is_external = any(tree.xpath(xpath) for xpath in EXTERNAL_XPATHS)
+
+    if is_laruche:
+        details['postulation_laruche'] = 'Oui'
+    elif is_external:
+        details['postulation_laruche'] = 'Non'
+    else:
+        details['postulation_laruche'] = 'Non'
+
+    # Extraire tous les champs
+    for field, label in FIELDS.items():
+        details[field] = clean_text(extract_after_label(tree, label))
+
+    if not details['code_mandat']:
+        raise UnexpectedLayout("code du mandat vide")
+
+    # Cas spécial pour le site web
+    site_web_links = tree.xpath(SITE_WEB_XPATH)
+    if site_web_links and site_web_links[0].get('href'):
+        details['site_web'] = urljoin(url, site_web_links[0].get('href'))
+
+    details['url'] = url
+    return details
@@ -0,0 +1,300 @@
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from mandat_store import MandatStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mandats (
+    code_mandat TEXT PRIMARY KEY,
+    titre_mandat TEXT,
+    employeur TEXT,
+    etat_mandat TEXT,
+    postulation_laruche TEXT,
+    date_limite TEXT,
+    data TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_mandats_date_limite ON mandats (date_limite);
+CREATE INDEX IF NOT EXISTS idx_mandats_employeur ON mandats (employeur);
+CREATE INDEX IF NOT EXISTS idx_mandats_postulation ON mandats (postulation_laruche, date_limite);
+CREATE TABLE IF NOT EXISTS listing_rows (
+    code_mandat TEXT PRIMARY KEY,
+    fingerprint TEXT,
+    seen_run INTEGER NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    closed_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_listing_rows_seen_run ON listing_rows (seen_run);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Index plein texte des champs rédigés, tenu à jour par des déclencheurs:
+# chaque upsert de mandat remplace sa ligne d'index (rowid partagé avec mandats)
+SEARCH_FIELDS = ('titre_mandat', 'specialites', 'description_mandat', 'exigences_mandat', 'lieu_travail')
+SEARCH_WEIGHTS = (5.0, 3.0, 1.0, 1.0, 2.0)
+_SEARCH_COLUMNS = ", ".join(SEARCH_FIELDS)
+
+
+def _search_values(data: str) -> str:
+    return ", ".join(f"json_extract({data}, '$.{field}')" for field in SEARCH_FIELDS)
+
+
+SEARCH_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS mandats_fts USING fts5 (
+    {_SEARCH_COLUMNS},
+    tokenize = "unicode61 remove_diacritics 2"
+);
+CREATE TRIGGER IF NOT EXISTS mandats_fts_insert AFTER INSERT ON mandats BEGIN
+    INSERT INTO mandats_fts (rowid, {_SEARCH_COLUMNS}) VALUES (new.rowid, {_search_values('new.data')});
+END;
+CREATE TRIGGER IF NOT EXISTS mandats_fts_update AFTER UPDATE OF data ON mandats BEGIN
+    DELETE FROM mandats_fts WHERE rowid = old.rowid;
+    INSERT INTO mandats_fts (rowid, {_SEARCH_COLUMNS}) VALUES (new.rowid, {_search_values('new.data')});
+END;
+CREATE TRIGGER IF NOT EXISTS mandats_fts_delete AFTER DELETE ON mandats BEGIN
+    DELETE FROM mandats_fts WHERE rowid = old.rowid;
+END;
+"""
+
+ETAT_ACCES_REFUSE = 'Non valide - Accès refusé'
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """Ouvre une connexion SQLite en mode WAL"""
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def to_iso_date(date_str: Optional[str]) -> Optional[str]:
+    """Convertit une date du portail (JJ-MM-AAAA) en AAAA-MM-JJ indexable"""
+    if not date_str:
+        return None
+    try:
+        return datetime.strptime(date_str, '%d-%m-%Y').strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+class MandatRepository:
+    """Dépôt SQLite des mandats, indexé sur le code, la date limite et l'employeur"""
+
+    def __init__(self, db_path: str = "mandats.db"):
+        self.db_path = db_path
+        self.conn = connect(db_path)
+        self.conn.executescript(SCHEMA)
+        self._init_search()
+
+    def _init_search(self):
+        """Crée l'index plein texte et y verse une seule fois les mandats déjà présents"""
+        self.conn.executescript(SEARCH_SCHEMA)
+        if self._get_meta('fts_initialise'):
+            return
+        with self.conn:
+            self.conn.execute(
+                f"INSERT INTO mandats_fts (rowid, {_SEARCH_COLUMNS}) SELECT rowid, {_search_values('data')} FROM mandats"
+            )
+            self._set_meta('fts_initialise', '1')
+
+    def close(self):
+        self.conn.close()
+
+    def upsert(self, mandat: Dict, commit: bool = True) -> bool:
+        """Insère ou remplace un mandat selon son code_mandat"""
+        code = mandat.get('code_mandat')
+        if not code:
+            return False
+
+        date_limite = to_iso_date(mandat.get('date_limite'))
+        if mandat.get('date_limite') and not date_limite:
+            print(f"Format de date invalide pour le mandat {code}: {mandat.get('date_limite')}")
+
+        self.conn.execute(
+            """
+            INSERT INTO mandats (code_mandat, titre_mandat, employeur, etat_mandat,
+                                 postulation_laruche, date_limite, data, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(code_mandat) DO UPDATE SET
+                titre_mandat = excluded.titre_mandat,
+                employeur = excluded.employeur,
+                etat_mandat = excluded.etat_mandat,
+                postulation_laruche = excluded.postulation_laruche,
+                date_limite = excluded.date_limite,
+                data = excluded.data,
+                updated_at = excluded.updated_at
+            """,
+            (
+                code,
+                mandat.get('titre_mandat'),
+                mandat.get('employeur'),
+                mandat.get('etat_mandat'),
+                mandat.get('postulation_laruche'),
+                date_limite,
+                json.dumps(mandat, ensure_ascii=False),
+                time.strftime('%Y-%m-%d %H:%M:%S'),
+            ),
+        )
+        if commit:
+            self.conn.commit()
+        return True
+
+    def upsert_many(self, mandats: Iterable[Dict]) -> int:
+        """Insère ou remplace plusieurs mandats dans une seule transaction"""
+        count = 0
+        with self.conn:
+            for mandat in mandats:
+                if self.upsert(mandat, commit=False):
+                    count += 1
+        return count
+
+    def get(self, code_mandat: str) -> Optional[Dict]:
+        row = self.conn.execute(
+            "SELECT data FROM mandats WHERE code_mandat = ?", (code_mandat,)
+        ).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM mandats").fetchone()[0]
+
+    def iter_all(self) -> Iterator[Dict]:
+        for row in self.conn.execute("SELECT data FROM mandats ORDER BY rowid"):
+            yield json.loads(row['data'])
+
+    def search(self, match: str, limit: int = 20) -> List[Dict]:
+        """Mandats correspondant à une requête FTS5, classés par BM25 (le titre et les spécialités pèsent plus)"""
+        rows = self.conn.execute(
+            f"""
+            SELECT m.data AS data,
+                   bm25(mandats_fts, {", ".join(str(weight) for weight in SEARCH_WEIGHTS)}) AS score,
+                   snippet(mandats_fts, -1, '[', ']', '…', 12) AS extrait
+            FROM mandats_fts
+            JOIN mandats m ON m.rowid = mandats_fts.rowid
+            WHERE mandats_fts MATCH ?
+            ORDER BY score
+            LIMIT ?
+            """,
+            (match, limit),
+        )
+        results = []
+        for row in rows:
+            mandat = json.loads(row['data'])
+            mandat['_score'] = -row['score']
+            mandat['_extrait'] = row['extrait']
+            results.append(mandat)
+        return results
+
+    def find_where(self, where: str, params: List) -> List[Dict]:
+        """Mandats satisfaisant une clause WHERE compilée, hors mandats retirés de la liste"""
+        rows = self.conn.execute(
+            f"""
+            SELECT data FROM mandats
+            WHERE {where}
+              AND NOT EXISTS (
+                  SELECT 1 FROM listing_rows l
+                  WHERE l.code_mandat = mandats.code_mandat AND l.closed_at IS NOT NULL
+              )
+            ORDER BY rowid
+            """,
+            params,
+        )
+        return [json.loads(row['data']) for row in rows]
+
+    def start_listing_run(self) -> int:
+        """Numérote un nouveau passage sur la liste des mandats"""
+        with self.conn:
+            run_id = int(self._get_meta('listing_run') or 0) + 1
+            self._set_meta('listing_run', str(run_id))
+        return run_id
+
+    def mark_listed(self, run_id: int, codes: Iterable[str]):
+        """Enregistre les mandats présents dans la liste lors de ce passage"""
+        now = time.strftime('%Y-%m-%d %H:%M:%S')
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO listing_rows (code_mandat, seen_run, first_seen, last_seen)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(code_mandat) DO UPDATE SET
+                    seen_run = excluded.seen_run,
+                    last_seen = excluded.last_seen,
+                    closed_at = NULL
+                """,
+                [(code, run_id, now, now) for code in codes],
+            )
+
+    def close_unlisted(self, run_id: int) -> List[str]:
+        """Marque comme fermés les mandats absents de la liste lors de ce passage"""
+        now = time.strftime('%Y-%m-%d %H:%M:%S')
+        with self.conn:
+            codes = [
+                row['code_mandat'] for row in self.conn.execute(
+                    "SELECT code_mandat FROM listing_rows WHERE seen_run < ? AND closed_at IS NULL",
+                    (run_id,),
+                )
+            ]
+            self.conn.execute(
+                "UPDATE listing_rows SET closed_at = ? WHERE seen_run < ? AND closed_at IS NULL",
+                (now, run_id),
+            )
+        return codes
+
+    def listing_fingerprints(self) -> Dict[str, Optional[str]]:
+        """Empreinte de la ligne de liste lors de la dernière extraction de chaque mandat"""
+        return {
+            row['code_mandat']: row['fingerprint']
+            for row in self.conn.execute("SELECT code_mandat, fingerprint FROM listing_rows")
+        }
+
+    def set_fingerprint(self, code_mandat: str, fingerprint: str):
+        """Retient l'empreinte de la ligne de liste du mandat qui vient d'être extrait"""
+        now = time.strftime('%Y-%m-%d %H:%M:%S')
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO listing_rows (code_mandat, fingerprint, seen_run, first_seen, last_seen)
+                VALUES (?, ?, 0, ?, ?)
+                ON CONFLICT(code_mandat) DO UPDATE SET fingerprint = excluded.fingerprint
+                """,
+                (code_mandat, fingerprint, now, now),
+            )
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def sync_from_store(self, store: MandatStore) -> int:
+        """Importe les mandats ajoutés au fichier JSONL depuis la dernière synchronisation"""
+        if not store.exists():
+            return 0
+
+        # Une compaction remplace le fichier: on reprend alors depuis le début
+        inode = str(os.stat(store.path).st_ino)
+        offset = int(self._get_meta('store_offset') or 0)
+        if self._get_meta('store_inode') != inode or offset > os.path.getsize(store.path):
+            offset = 0
+
+        count = 0
+        with self.conn:
+            for mandat, offset in store.iter_from(offset):
+                if self.upsert(mandat, commit=False):
+                    count += 1
+            self._set_meta('store_inode', inode)
+            self._set_meta('store_offset', str(offset))
+        return count
@@ -0,0 +1,92 @@
+"""Recherche plein texte dans les mandats (index FTS5 de mandats.db)
+
+    python mandat_search.py solidworks fem lieu:montréal
+    python mandat_search.py '"analyse de données"' python --limit 10
+    python mandat_search.py --brut 'titre_mandat:ingénieur NOT stage'
+
+Les termes sont combinés par ET, sans tenir compte des accents ni de la casse;
+un terme terminé par * est un préfixe. champ:terme restreint la recherche à un
+champ (titre, specialites, description, exigences, lieu).
+"""
+import argparse
+import shlex
+import time
+from typing import List
+
+from mandat_repository import MandatRepository, SEARCH_FIELDS
+from mandat_store import MandatStore
+
+FIELD_ALIASES = {
+    'titre': 'titre_mandat',
+    'description': 'description_mandat',
+    'exigences': 'exigences_mandat',
+    'lieu': 'lieu_travail',
+}
+
+
+def build_match(query: str) -> str:
+    """Traduit une saisie libre en expression MATCH FTS5 (termes échappés, combinés par ET)"""
+    try:
+        tokens = shlex.split(query)
+    except ValueError:
+        # Apostrophe non fermée (l'ingénieur): découpage simple
+        tokens = query.split()
+
+    terms = []
+    for token in tokens:
+        field = None
+        if ':' in token:
+            prefix, rest = token.split(':', 1)
+            prefix = FIELD_ALIASES.get(prefix, prefix)
+            if prefix in SEARCH_FIELDS and rest:
+                field, token = prefix, rest
+
+        star = token.endswith('*')
+        token = token.rstrip('*')
+        if not token:
+            continue
+        term = '"' + token.replace('"', '""') + '"' + ('*' if star else '')
+        terms.append(f"{field} : {term}" if field else term)
+    return " AND ".join(terms)
+
+
+def print_results(results: List[dict], elapsed: float):
+    print(f"{len(results)} mandats trouvés en {elapsed * 1000:.1f} ms")
+    for mandat in results:
+        print(f"\n[{mandat['_score']:.2f}] {mandat.get('code_mandat')} - {mandat.get('titre_mandat')}")
+        print(f"Employeur: {mandat.get('employeur')} | Lieu: {mandat.get('lieu_travail')} | "
+              f"Date limite: {mandat.get('date_limite')}")
+        print(f"  {mandat['_extrait']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recherche plein texte dans les mandats")
+    parser.add_argument('termes', nargs='+', help="Termes recherchés")
+    parser.add_argument('--limit', type=int, default=20, help="Nombre maximal de résultats")
+    parser.add_argument('--brut', action='store_true', help="Passer la requête telle quelle à FTS5")
+    args = parser.parse_args()
+
+    repository = MandatRepository("mandats.db")
+    try:
+        # L'index suit la base: on y importe d'abord les mandats extraits depuis la dernière fois
+        repository.sync_from_store(MandatStore("mandats.jsonl"))
+
+        query = " ".join(args.termes)
+        match = query if args.brut else build_match(query)
+        if not match:
+            print("Requête vide")
+            return
+
+        start = time.perf_counter()
+        try:
+            results = repository.search(match, limit=args.limit)
+        except Exception as e:
+            print(f"Requête invalide ({match}): {str(e)}")
+            return
+        print_results(results, time.perf_counter() - start)
+    finally:
+        repository.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+
+class MandatStore:
+    """Stockage des mandats en JSONL (un mandat par ligne, ajout en O(1))"""
+
+    def __init__(self, path: str = "mandats.jsonl", fsync_every: int = 20):
+        self.path = Path(path)
+        self.fsync_every = fsync_every
+        self._file = None
+        self._pending = 0
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        return self._file
+
+    def append(self, mandat: Dict):
+        """Ajoute un mandat à la fin du fichier sans relire l'existant"""
+        f = self._open()
+        f.write(json.dumps(mandat, ensure_ascii=False) + '\n')
+        f.flush()
+        self._pending += 1
+        # Les fsync sont regroupés pour ne pas payer un accès disque par mandat
+        if self._pending >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        """Force l'écriture sur disque des mandats ajoutés"""
+        if self._file is not None and self._pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+
+    def close(self):
+        """Synchronise et ferme le fichier"""
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def iter_mandats(self) -> Iterator[Dict]:
+        """Parcourt les mandats ligne par ligne sans charger tout le fichier"""
+        if self._file is not None:
+            self._file.flush()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line_no, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        mandat = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Ligne tronquée (arrêt brutal pendant une écriture)
+                        print(f"Ligne {line_no} invalide dans {self.path}, ignorée")
+                        continue
+                    if isinstance(mandat, dict):
+                        yield mandat
+        except FileNotFoundError:
+            return
+
+    def iter_from(self, offset: int = 0) -> Iterator[Tuple[Dict, int]]:
+        """Parcourt les mandats à partir d'une position en octets
+
+        Renvoie chaque mandat avec la position de la ligne suivante, ce qui
+        permet de reprendre une lecture incrémentale. Une dernière ligne
+        incomplète n'est pas consommée.
+        """
+        if self._file is not None:
+            self._file.flush()
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    offset += len(line)
+                    try:
+                        mandat = json.loads(line)
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        continue
+                    if isinstance(mandat, dict):
+                        yield mandat, offset
+        except FileNotFoundError:
+            return
+
+    def compact(self, transform: Optional[Callable[[Dict], Dict]] = None) -> int:
+        """Réécrit le fichier en ne gardant que la dernière version de chaque mandat"""
+        self.close()
+        latest = {}
+        anonymous = []
+        for mandat in self.iter_mandats():
+            if transform:
+                mandat = transform(mandat)
+            code = mandat.get('code_mandat')
+            if code:
+                # Réinsérer pour conserver l'ordre de la dernière écriture
+                latest.pop(code, None)
+                latest[code] = mandat
+            else:
+                anonymous.append(mandat)
+
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for mandat in anonymous + list(latest.values()):
+                f.write(json.dumps(mandat, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return len(anonymous) + len(latest)
+
+    def migrate_from_json(self, json_path: str = "mandats.json") -> int:
+        """Importe une seule fois l'ancien fichier mandats.json"""
+        if self.exists():
+            return 0
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                mandats = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except json.JSONDecodeError:
+            print(f"Erreur de lecture du fichier {json_path}, migration impossible")
+            return 0
+
+        count = 0
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for mandat in mandats:
+                if isinstance(mandat, dict):
+                    f.write(json.dumps(mandat, ensure_ascii=False) + '\n')
+                    count += 1
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        print(f"{count} mandats migrés de {json_path} vers {self.path}")
+        return count
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('compact', 'migrate'):
+        print("Usage: python mandat_store.py compact|migrate [mandats.json]")
+        return
+
+    store = MandatStore()
+    if sys.argv[1] == 'migrate':
+        json_path = sys.argv[2] if len(sys.argv) > 2 else "mandats.json"
+        if store.exists():
+            print(f"{store.path} existe déjà, migration ignorée")
+        else:
+            store.migrate_from_json(json_path)
+    else:
+        count = store.compact()
+        print(f"Compaction terminée: {count} mandats conservés dans {store.path}")
+
+
+if __name__ == "__main__":
+    main()
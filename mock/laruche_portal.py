@@ -0,0 +1,356 @@
+"""Serveur local imitant le portail LaRuche, pour mesurer l'extraction sans le vrai site
+
+    python mock/laruche_portal.py --port 8002 --mandats 500 --latency 0.2 --refus 0.05
+    python mock/laruche_portal.py --session-ttl 60     # sessions expirées après une minute
+
+Pages servies (mêmes chemins et mêmes structures que le portail):
+    /sp/ssp/r/etudiant/recherche-mandats   formulaire de connexion, puis liste paginée
+    /sp/ssp/r/etudiant/connexion            POST du formulaire, pose le cookie de session
+    /sp/ssp/r/etudiant/mandat?code=...      page de détails ou l'une des pages d'accès refusé
+
+Sans cookie de session valide, la liste et les mandats renvoient le formulaire
+de connexion. Une session expirée (--session-ttl) est redirigée vers la page
+de connexion ou reçoit la page d'expiration d'APEX, en alternance.
+"""
+import argparse
+import html
+import random
+import secrets
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from mandat_parser import FIELDS
+
+LISTING_PATH = '/sp/ssp/r/etudiant/recherche-mandats'
+LOGIN_PATH = '/sp/ssp/r/etudiant/connexion'
+MANDAT_PATH = '/sp/ssp/r/etudiant/mandat'
+LOGIN_PAGE_PATH = '/sp/ssp/r/etudiant/login'
+SESSION_COOKIE = 'ORA_WWV_APP_SSP'
+ROWS_CHOICES = (15, 50, 100, 500)
+
+WORDS = ("conception analyse données équipe projet développement logiciel mécanique électrique "
+         "simulation essais prototype fabrication automatisation contrôle qualité mesure capteurs "
+         "optimisation procédés environnement énergie structure calcul modélisation réseau "
+         "sécurité validation documentation client rapport Python MATLAB SolidWorks CATIA").split()
+LIEUX = ('Montréal', 'Laval', 'Longueuil', 'Québec', 'Sherbrooke', 'Boucherville')
+MODES = ('Présentiel', 'Hybride', 'Télétravail')
+SPECIALITES = ('Génie mécanique', 'Génie électrique', 'Génie informatique', 'Génie logiciel',
+               'Génie chimique', 'Génie industriel', 'Génie civil', 'Génie physique')
+
+
+def build_catalog(count: int, denied_ratio: float, seed: int = 42):
+    """Mandats fictifs, identiques d'un lancement à l'autre pour une même graine"""
+    rng = random.Random(seed)
+    today = date.today()
+    catalog = {}
+    for i in range(count):
+        code = f"M{26000 + i}"
+        employer = f"Employeur {i % max(1, count // 10)} inc."
+        catalog[code] = {
+            'etat_mandat': 'Affiché',
+            'date_limite': (today + timedelta(days=rng.randint(-5, 90))).strftime('%d-%m-%Y'),
+            'employeur': employer,
+            'description_employeur': " ".join(rng.choices(WORDS, k=40)),
+            'site_web': f"https://www.employeur{i % max(1, count // 10)}.example.com",
+            'lieu_travail': rng.choice(LIEUX),
+            'mode_travail': rng.choice(MODES),
+            'precisions_mode_travail': f"{rng.randint(1, 4)} jours au bureau par semaine",
+            'code_mandat': code,
+            'debut_mandat': (today + timedelta(days=rng.randint(30, 150))).strftime('%d-%m-%Y'),
+            'duree': f"{rng.choice((4, 8, 12))} mois",
+            'possibilite_prolongation': rng.choice(('Oui', 'Non')),
+            'titre_mandat': "Stagiaire en " + " ".join(rng.choices(WORDS, k=3)),
+            'description_mandat': "\n".join(" ".join(rng.choices(WORDS, k=60)) for _ in range(3)),
+            'exigences_mandat': "\n".join(" ".join(rng.choices(WORDS, k=12)) for _ in range(4)),
+            'niveau_etudes': 'Baccalauréat',
+            'specialites': ", ".join(rng.sample(SPECIALITES, 2)),
+            # 0: postulation sur LaRuche, 1: postulation externe, 2-4: variantes d'accès refusé
+            '_variante': (2 + rng.randrange(3)) if rng.random() < denied_ratio else rng.choice((0, 0, 1)),
+        }
+    return catalog
+
+
+def page(title: str, body: str) -> str:
+    return ("<!DOCTYPE html><html lang=\"fr\"><head><meta charset=\"utf-8\">"
+            f"<title>{html.escape(title)}</title></head><body>{body}</body></html>")
+
+
+def login_page() -> str:
+    # Même imbrication que le portail: PortalScraper localise les champs par XPath absolu
+    return page("Connexion", f"""
+<div class="t-Header"></div>
+<div class="t-Navigation"></div>
+<div class="t-Body"><main><div>
+  <div class="t-Body-title"></div>
+  <div class="t-Body-content"><section><div>
+    <div class="t-Login-header"><h2>LaRuche</h2></div>
+    <div class="t-Login-body"><form method="post" action="{LOGIN_PATH}"><h3>
+      <section><div><label>Code d'accès <input type="text" name="username"></label></div></section>
+      <section><div><div><label>Mot de passe <input type="password" name="password"></label></div></div></section>
+      <div><button type="submit">Se connecter</button></div>
+    </h3></form></div>
+  </div></section></div>
+</div></main></div>
+""")
+
+
+# Le changement de taille de page affiche l'indicateur APEX jusqu'au rechargement
+ROWS_SCRIPT = """
+<script>
+document.getElementById('rows').addEventListener('change', function (event) {
+    var spinner = document.createElement('div');
+    spinner.className = 'u-Processing';
+    document.body.appendChild(spinner);
+    var params = new URLSearchParams(location.search);
+    params.set('rows', event.target.value);
+    params.delete('page');
+    location.search = params.toString();
+});
+</script>
+"""
+
+
+def listing_page(catalog: dict, query: dict) -> str:
+    codes = list(catalog)
+    rows = int(query.get('rows', [ROWS_CHOICES[0]])[0])
+    page_number = max(1, int(query.get('page', ['1'])[0]))
+    start = (page_number - 1) * rows
+    shown = codes[start:start + rows]
+
+    # Comme dans APEX, les liens reprennent l'identifiant de session de la page
+    session = {'session': query['session'][0]} if 'session' in query else {}
+    lines = []
+    for code in shown:
+        mandat = catalog[code]
+        url = f"{MANDAT_PATH}?{urlencode({'code': code, **session})}"
+        lines.append(
+            f"<tr><td>{code}</td><td><a href=\"{url}\">{html.escape(mandat['titre_mandat'])}</a></td>"
+            f"<td>{html.escape(mandat['employeur'])}</td><td>{mandat['date_limite']}</td></tr>"
+        )
+
+    options = "".join(
+        f"<option value=\"{value}\"{' selected' if value == rows else ''}>{value}</option>"
+        for value in ROWS_CHOICES
+    )
+    pagination = ""
+    if start + rows < len(codes):
+        params = {key: values[0] for key, values in query.items()}
+        params.update(page=page_number + 1, rows=rows)
+        pagination = (f"<a class=\"t-Report-paginationLink t-Report-paginationLink--next\" rel=\"next\" "
+                      f"href=\"{LISTING_PATH}?{urlencode(params)}\">Suivant</a>")
+
+    return page("Recherche de mandats", f"""
+<div class="t-Body"><main>
+  <label>Lignes <select id="rows">{options}</select></label>
+  <table class="t-Report-report"><thead><tr><th>Code</th><th>Titre</th><th>Employeur</th><th>Date limite</th></tr></thead>
+  <tbody>{''.join(lines)}</tbody></table>
+  <div class="t-Report-pagination">{pagination}</div>
+</main></div>
+{ROWS_SCRIPT}
+""")
+
+
+def expired_page() -> str:
+    return page("Session expirée", "<main><div class=\"t-Alert t-Alert--warning\"><div class=\"t-Alert-body\">"
+                                   "Votre session a expiré.</div></div>"
+                                   f"<a href=\"{LISTING_PATH}\">Se connecter</a></main>")
+
+
+def field(label: str, value: str) -> str:
+    return (f"<div class=\"t-Form-fieldContainer\"><div class=\"t-Form-labelContainer\">"
+            f"<label>{html.escape(label)}</label></div><div class=\"t-Form-inputContainer\">"
+            f"<span class=\"display_only\">{value}</span></div></div>")
+
+
+def mandat_page(mandat: dict, labels: dict) -> str:
+    variante = mandat['_variante']
+    ref_id = f"{int(mandat['code_mandat'][1:]) * 7919 % 10 ** 8:08d}"
+    if variante == 2:
+        return page("Erreur", f"<main><h3>Vous n'avez pas accès à cette page. Ref.ID: {ref_id}</h3></main>")
+    if variante == 3:
+        return page("Erreur", "<main><div class=\"t-Alert t-Alert--danger\"><div class=\"t-Alert-body\">"
+                              f"Erreur d'autorisation<br>Ref.ID: {ref_id}</div></div></main>")
+    if variante == 4:
+        return page("Erreur", "<main><p>Accès refusé par le contrôle de sécurité de la page</p></main>")
+
+    fields = []
+    for key, label in labels.items():
+        value = mandat[key]
+        if key == 'site_web':
+            value = f"<a href=\"{value}\">{html.escape(value)}</a>"
+        else:
+            value = html.escape(value).replace("\n", "<br>")
+        fields.append(field(label, value))
+
+    if variante == 0:
+        postulation = ("<div>Le document doit être en format .PDF</div>"
+                       "<label>Choisir un CV</label><label>Choisir une lettre</label>")
+    else:
+        postulation = "<div>Instruction de postulation</div><p>Postuler sur le site de l'employeur.</p>"
+    return page(mandat['titre_mandat'], f"<main><form>{''.join(fields)}</form>"
+                                        f"<section class=\"postulation\">{postulation}</section></main>")
+
+
+def make_handler(catalog: dict, labels: dict, latency: float, jitter: float, stats: dict,
+                 session_ttl: float = 0.0):
+    # Jeton du cookie -> heure de connexion
+    sessions = {}
+    lock = threading.Lock()
+
+    class PortalHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def count(self, kind: str):
+            with lock:
+                stats[kind] = stats.get(kind, 0) + 1
+
+        def simulate_latency(self):
+            delay = latency + random.uniform(0, jitter)
+            if delay > 0:
+                time.sleep(delay)
+
+        def send_html(self, body: str, status: int = 200, headers: dict = None):
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def session_state(self) -> str:
+            """'valide', 'expiree' ou 'absente'"""
+            for part in self.headers.get('Cookie', '').split(';'):
+                name, _, value = part.strip().partition('=')
+                if name != SESSION_COOKIE:
+                    continue
+                with lock:
+                    started = sessions.get(value)
+                if started is None:
+                    continue
+                if session_ttl and time.monotonic() - started > session_ttl:
+                    return 'expiree'
+                return 'valide'
+            return 'absente'
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            if url.path == LOGIN_PAGE_PATH:
+                self.count('connexion')
+                self.send_html(login_page())
+                return
+            if url.path not in (LISTING_PATH, MANDAT_PATH):
+                # Page d'accueil: le pool de navigateurs s'y rend avant de copier les cookies
+                self.send_html(page("LaRuche", "<main>LaRuche</main>"), 200 if url.path == '/' else 404)
+                return
+
+            self.simulate_latency()
+            state = self.session_state()
+            if state == 'expiree':
+                self.count('expiration')
+                if stats['expiration'] % 2:
+                    self.send_html("", 302, {'Location': LOGIN_PAGE_PATH})
+                else:
+                    self.send_html(expired_page())
+                return
+            if state == 'absente':
+                self.count('connexion')
+                self.send_html(login_page())
+                return
+
+            if url.path == LISTING_PATH:
+                self.count('liste')
+                self.send_html(listing_page(catalog, query))
+                return
+
+            mandat = catalog.get(query.get('code', [''])[0])
+            if mandat is None:
+                self.count('introuvable')
+                self.send_html(page("Introuvable", "<main>Mandat introuvable</main>"), 404)
+                return
+            self.count('refus' if mandat['_variante'] >= 2 else 'mandat')
+            self.send_html(mandat_page(mandat, labels))
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            form = parse_qs(self.rfile.read(length).decode('utf-8'))
+            if urlsplit(self.path).path != LOGIN_PATH:
+                self.send_html(page("Introuvable", ""), 404)
+                return
+
+            self.simulate_latency()
+            if not form.get('username') or not form.get('password'):
+                self.count('connexion')
+                self.send_html(login_page())
+                return
+
+            token = secrets.token_hex(16)
+            with lock:
+                sessions[token] = time.monotonic()
+            self.count('session')
+            # Le portail redirige vers la liste avec un nouvel identifiant de session dans l'URL
+            location = f"{LISTING_PATH}?{urlencode({'p40_type_recherche': 'C', 'session': secrets.randbelow(10 ** 13)})}"
+            self.send_html("", 303, {
+                'Location': location,
+                'Set-Cookie': f"{SESSION_COOKIE}={token}; Path=/; HttpOnly",
+            })
+
+    return PortalHandler
+
+
+def start_server(port: int = 0, mandats: int = 200, latency: float = 0.0, jitter: float = 0.0,
+                 denied_ratio: float = 0.05, seed: int = 42, session_ttl: float = 0.0):
+    """Démarre le portail de test dans un thread; renvoie (serveur, statistiques)"""
+    stats = {}
+    catalog = build_catalog(mandats, denied_ratio, seed)
+    server = ThreadingHTTPServer(('127.0.0.1', port),
+                                 make_handler(catalog, FIELDS, latency, jitter, stats, session_ttl))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+def portal_url(server) -> str:
+    """URL de la liste, à utiliser comme login_url de PortalScraper"""
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}{LISTING_PATH}?p40_type_recherche=C&session=1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur local imitant le portail LaRuche")
+    parser.add_argument('--port', type=int, default=8002)
+    parser.add_argument('--mandats', type=int, default=200, help="Nombre de mandats du catalogue")
+    parser.add_argument('--latency', type=float, default=0.1, help="Durée minimale de chaque page (secondes)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Délai aléatoire ajouté à chaque page (secondes)")
+    parser.add_argument('--refus', type=float, default=0.05, help="Part des mandats dont l'accès est refusé")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--session-ttl', type=float, default=0.0, help="Durée de vie d'une session (0: illimitée)")
+    args = parser.parse_args()
+
+    server, stats = start_server(args.port, args.mandats, args.latency, args.jitter, args.refus, args.seed,
+                                 args.session_ttl)
+    print(f"Portail de test sur {portal_url(server)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        print("Requêtes reçues: " + ", ".join(f"{kind}={count}" for kind, count in sorted(stats.items())))
+
+
+if __name__ == "__main__":
+    main()
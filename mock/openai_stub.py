@@ -0,0 +1,102 @@
+"""Serveur local imitant l'API de complétion, pour tester la génération des lettres
+
+    python mock/openai_stub.py --port 8001 --latency 0.5 --rpm 120
+    python motivation_letter_gen.py --api-url http://127.0.0.1:8001/v1/chat/completions
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class RateWindow:
+    """Fenêtre fixe d'une minute, comme les limites par minute de l'API"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.window_start = time.monotonic()
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def hit(self):
+        """Renvoie (accepté, restant, secondes avant réinitialisation)"""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 60:
+                self.window_start = now
+                self.count = 0
+            reset = 60 - (now - self.window_start)
+            if self.count >= self.limit:
+                return False, 0, reset
+            self.count += 1
+            return True, self.limit - self.count, reset
+
+
+def make_handler(latency: float, window: RateWindow, stats: dict):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, body, headers):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+
+            accepted, remaining, reset = window.hit()
+            headers = {
+                'x-ratelimit-limit-requests': str(window.limit),
+                'x-ratelimit-remaining-requests': str(remaining),
+                'x-ratelimit-reset-requests': f"{reset:.3f}s",
+            }
+            with window.lock:
+                stats['requests'] += 1
+                if not accepted:
+                    stats['rejected'] += 1
+            if not accepted:
+                headers['retry-after'] = f"{reset:.3f}"
+                self.send_json(429, {'error': {'message': 'Rate limit reached'}}, headers)
+                return
+
+            time.sleep(latency)
+            user_content = payload.get('messages', [{}])[-1].get('content', '')
+            self.send_json(200, {
+                'choices': [{'message': {'role': 'assistant',
+                                         'content': f"Lettre de test\n{user_content.strip()}"}}]
+            }, headers)
+
+    return StubHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur local imitant l'API de complétion")
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.5, help="Durée de chaque réponse (secondes)")
+    parser.add_argument('--rpm', type=int, default=600, help="Requêtes acceptées par minute avant les 429")
+    args = parser.parse_args()
+
+    stats = {'requests': 0, 'rejected': 0}
+    server = ThreadingHTTPServer(('127.0.0.1', args.port),
+                                 make_handler(args.latency, RateWindow(args.rpm), stats))
+    print(f"API de test sur http://127.0.0.1:{args.port}/v1/chat/completions")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"{stats['requests']} requêtes reçues, {stats['rejected']} refusées (429)")
+
+
+if __name__ == "__main__":
+    main()
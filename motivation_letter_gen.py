@@ -1,15 +1,35 @@
+import argparse
+import asyncio
 import json
-import requests
 import time
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+from letter_client import AsyncCompletionClient, CompletionError
+from letter_cache import LetterCache
+from letter_batch import BatchLetterJob, FakeBatchTransport, OpenAIBatchTransport
+from letter_store import LetterStore
+from relevance import RelevanceScorer, profile_from_prompt
+from near_duplicates import NearDuplicateIndex
+import instrumentation
+from instrumentation import StageTimings
 
 class MotivationLetterGenerator:
-    def __init__(self):
+    def __init__(self, api_url: Optional[str] = None, use_cache: bool = True,
+                 top_k: Optional[int] = None, min_score: Optional[float] = None):
         self.filtered_mandats_file = "mandats_filtered.json"
+        # Copie JSON lisible des lettres; la référence est la table lettres de mandats.db
         self.output_file = "lettres_motivation.json"
+        self.letters = LetterStore("mandats.db", legacy_json=self.output_file)
         self.api_key = self.load_api_key()
-        self.api_url = "https://api.openai.com/v1/chat/completions"
+        self.api_url = api_url or "https://api.openai.com/v1/chat/completions"
+        self.model = "o3-mini"
+        self.cache = LetterCache("cache_lettres") if use_cache else None
+        # Sélection par pertinence avant génération (aucune limite par défaut)
+        self.top_k = top_k
+        self.min_score = min_score
+        self.profile_file = "config/profil.txt"
+        self.timings = StageTimings()
         self.system_prompt ="""Tu es un expert en rédaction de lettres de motivation pour Philippe Lebel, étudiant en génie mécanique à Polytechnique Montréal.
 
         PROFIL DU CANDIDAT :
@@ -127,103 +147,242 @@ Philippe Lebel
         except Exception as e:
             raise Exception(f"Erreur lors du chargement des mandats filtrés: {str(e)}")
 
-    def generate_letter(self, mandat: Dict) -> Dict:
-        """Génère une lettre de motivation pour un mandat donné"""
-        try:
-            # Préparer le contenu pour le prompt
-            job_content = f"""
+    def build_payload(self, mandat: Dict) -> Dict:
+        """Prépare la requête de complétion pour un mandat"""
+        # Préparer le contenu pour le prompt
+        job_content = f"""
             Titre du poste: {mandat.get('titre_mandat', '')}
             Employeur: {mandat.get('employeur', '')}
             Exigences: {mandat.get('exigences_mandat', '')}
             Description du poste: {mandat.get('description_mandat', '')}
             """
 
-            # Préparer les headers et le payload
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
-
-            payload = {
-                "model": "o3-mini",
-                "messages": [
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": job_content}
-                ],
-            }
-
-            # Faire la requête à l'API
-            response = requests.post(self.api_url, headers=headers, json=payload)
-            
-            # Vérifier si la requête a réussi
-            if response.status_code == 200:
-                response_data = response.json()
-                letter_content = response_data['choices'][0]['message']['content']
-                
-                return {
-                    "code_mandat": mandat.get('code_mandat'),
-                    "employeur": mandat.get('employeur'),
-                    "url": mandat.get('url'),
-                    "lettre_de_motivation": letter_content
-                }
-            else:
-                print(f"Erreur API ({response.status_code}): {response.text}")
-                return None
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": job_content}
+            ],
+        }
 
+    def letter_from_response(self, mandat: Dict, response_data: Dict) -> Dict:
+        """Construit l'entrée de lettre à partir de la réponse de l'API"""
+        letter_content = response_data['choices'][0]['message']['content']
+        
+        return {
+            "code_mandat": mandat.get('code_mandat'),
+            "employeur": mandat.get('employeur'),
+            "url": mandat.get('url'),
+            "lettre_de_motivation": letter_content
+        }
+
+    def cached_response(self, payload: Dict) -> Optional[Dict]:
+        """Réponse déjà obtenue pour une requête identique"""
+        if self.cache is None:
+            return None
+        return self.cache.get(LetterCache.key(payload, self.api_url))
+
+    def cache_response(self, payload: Dict, response_data: Dict):
+        if self.cache is not None:
+            self.cache.put(LetterCache.key(payload, self.api_url), response_data)
+
+    async def generate_letter_async(self, client: AsyncCompletionClient, mandat: Dict) -> Optional[Dict]:
+        """Génère une lettre avec le client asynchrone (réessais et limites gérés par le client)"""
+        try:
+            payload = self.build_payload(mandat)
+            response_data = self.cached_response(payload)
+            if response_data is None:
+                response_data = await client.complete(payload, code_mandat=mandat.get('code_mandat'))
+                self.cache_response(payload, response_data)
+            return self.letter_from_response(mandat, response_data)
+        except CompletionError as e:
+            print(f"{e} - mandat {mandat.get('code_mandat')}")
         except Exception as e:
             print(f"Erreur lors de la génération de la lettre pour le mandat {mandat.get('code_mandat')}: {str(e)}")
-            return None
+        return None
 
     def save_letter(self, letter: Dict):
-        """Sauvegarde une lettre dans le fichier JSON"""
+        """Sauvegarde une lettre (remplace la lettre existante du même mandat)"""
         try:
-            # Charger les lettres existantes ou créer une nouvelle liste
-            try:
-                with open(self.output_file, 'r', encoding='utf-8') as f:
-                    letters = json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
-                letters = []
-            
-            # Ajouter la nouvelle lettre
-            letters.append(letter)
-            
-            # Sauvegarder toutes les lettres
-            with open(self.output_file, 'w', encoding='utf-8') as f:
-                json.dump(letters, f, ensure_ascii=False, indent=2)
-            
+            self.letters.upsert(letter)
             print(f"Lettre pour le mandat {letter['code_mandat']} sauvegardée")
-        
         except Exception as e:
             print(f"Erreur lors de la sauvegarde de la lettre: {str(e)}")
 
-    def run(self):
-        """Exécute le processus de génération des lettres"""
+    def merge_letters(self, new_letters: List[Dict]):
+        """Fusionne des lettres par code_mandat (une lettre par mandat) en une seule transaction"""
+        if new_letters:
+            self.letters.upsert_many(new_letters)
+
+    def pending_mandats(self, mandats: List[Dict]) -> List[Dict]:
+        """Mandats qui n'ont pas encore de lettre"""
+        return self.letters.pending(mandats)
+
+    def load_profile(self) -> str:
+        """Profil du candidat pour le score de pertinence: config/profil.txt, sinon celui du prompt"""
+        try:
+            with open(self.profile_file, 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return profile_from_prompt(self.system_prompt)
+
+    def reuse_duplicate_letters(self, mandats: List[Dict]) -> List[Dict]:
+        """Reprend la lettre d'un mandat quasi identique du même employeur; renvoie les mandats restants
+
+        Un doublon chez un autre employeur est seulement signalé: la lettre cite l'employeur.
+        """
+        index = NearDuplicateIndex("mandats.db")
+        remaining = []
+        reused = []
+        try:
+            for mandat in mandats:
+                code = mandat.get('code_mandat')
+                letters = [letter for letter in map(self.letters.get, index.members(code)) if letter]
+                same_employer = [letter for letter in letters if letter.get('employeur') == mandat.get('employeur')]
+                if same_employer:
+                    source = same_employer[0]
+                    reused.append({
+                        **source,
+                        "code_mandat": code,
+                        "url": mandat.get('url'),
+                        "reprise_de": source['code_mandat']
+                    })
+                    continue
+                if letters:
+                    print(f"Mandat {code} quasi identique à {letters[0]['code_mandat']} "
+                          f"({letters[0].get('employeur')}): nouvelle lettre nécessaire")
+                remaining.append(mandat)
+        finally:
+            index.close()
+
+        if reused:
+            self.merge_letters(reused)
+            print(f"{len(reused)} lettres reprises de mandats quasi identiques")
+        return remaining
+
+    def select_mandats(self) -> List[Dict]:
+        """Mandats filtrés sans lettre, limités aux plus pertinents si top_k ou min_score est défini"""
+        mandats = self.reuse_duplicate_letters(self.pending_mandats(self.load_filtered_mandats()))
+        if self.top_k is None and self.min_score is None:
+            return mandats
+
+        scorer = RelevanceScorer(self.load_profile())
+        try:
+            print(f"Classement de {len(mandats)} mandats par pertinence:")
+            selected = scorer.select(mandats, top_k=self.top_k, min_score=self.min_score)
+        finally:
+            scorer.close()
+        print(f"{len(selected)}/{len(mandats)} mandats retenus")
+        return selected
+
+    def export_letters(self) -> bool:
+        """Met à jour la copie JSON des lettres (une écriture par exécution)"""
+        try:
+            count = self.letters.export_json(self.output_file)
+            print(f"{count} lettres exportées dans {self.output_file}")
+            return True
+        except Exception as e:
+            print(f"Erreur lors de l'export des lettres: {str(e)}")
+            return False
+
+    def finish_cache(self):
+        """Éviction du cache (taille et âge maximaux) et statistiques, en fin de génération"""
+        if self.cache is not None:
+            self.cache.evict()
+            self.cache.print_stats()
+
+    def run_batch(self, fake: bool = False, poll_interval: float = 60):
+        """Génère les lettres manquantes via un lot traité en différé par l'API
+
+        En mode fake, les réponses factices vont dans des fichiers de test
+        (lettres_test.db, lettres_test.json, batch_lettres_test_*): ni le cache,
+        ni les lettres, ni l'état du lot réels ne sont modifiés.
+        """
+        print("Début de la génération des lettres par lot...")
+        if fake:
+            self.cache = None
+            self.letters.close()
+            self.output_file = "lettres_test.json"
+            self.letters = LetterStore("lettres_test.db", legacy_json=None)
+            job = BatchLetterJob(self, FakeBatchTransport(), input_file="batch_lettres_test.jsonl",
+                                 state_file="batch_lettres_test_etat.json")
+        else:
+            transport = OpenAIBatchTransport(self.api_key, base_url=self.api_url.rsplit('/chat/completions', 1)[0])
+            job = BatchLetterJob(self, transport)
+
+        mandats = self.select_mandats()
+        print(f"Nombre de mandats sans lettre: {len(mandats)}")
+        job.run(mandats, poll_interval=poll_interval)
+        self.export_letters()
+        self.finish_cache()
+
+    async def generate_all(self, mandats: List[Dict], concurrency: int, requests_per_second: float) -> int:
+        """Génère les lettres en parallèle; chaque lettre est sauvegardée dès qu'elle est prête"""
+        client = AsyncCompletionClient(
+            self.api_url,
+            self.api_key,
+            concurrency=concurrency,
+            requests_per_second=requests_per_second,
+            timings=self.timings
+        )
+        success_count = 0
+        try:
+            tasks = [asyncio.create_task(self.generate_letter_async(client, mandat)) for mandat in mandats]
+            for i, task in enumerate(asyncio.as_completed(tasks), 1):
+                letter = await task
+                if letter:
+                    # Un seul écrivain: la boucle principale
+                    self.save_letter(letter)
+                    success_count += 1
+                    print(f"Lettre {i}/{len(mandats)} générée et sauvegardée avec succès")
+        finally:
+            await client.aclose()
+        return success_count
+
+    def run(self, concurrency: int = 8, requests_per_second: float = 5.0) -> bool:
+        """Exécute le processus de génération des lettres; renvoie False si une lettre a échoué"""
         print("Début de la génération des lettres de motivation...")
         
-        # Charger les mandats filtrés
-        mandats = self.load_filtered_mandats()
+        # Charger les mandats filtrés qui n'ont pas encore de lettre
+        mandats = self.select_mandats()
         print(f"Nombre de mandats à traiter: {len(mandats)}")
 
-        # Générer et sauvegarder les lettres une par une
-        success_count = 0
-        for i, mandat in enumerate(mandats, 1):
-            print(f"\nTraitement du mandat {i}/{len(mandats)}: {mandat.get('code_mandat')}")
-            
-            letter = self.generate_letter(mandat)
-            if letter:
-                # Sauvegarder immédiatement la lettre
-                self.save_letter(letter)
-                success_count += 1
-                print(f"Lettre générée et sauvegardée avec succès")
-            
-            # Pause pour éviter de dépasser les limites de l'API
-            time.sleep(0.5)
-
-        print(f"\nGénération terminée. {success_count} lettres générées et sauvegardées.")
+        start = time.perf_counter()
+        success_count = asyncio.run(self.generate_all(mandats, concurrency, requests_per_second))
+        exported = self.export_letters()
+        self.finish_cache()
+
+        print(f"\nGénération terminée en {time.perf_counter() - start:.1f}s. "
+              f"{success_count} lettres générées et sauvegardées.")
+        if success_count < len(mandats):
+            print(f"{len(mandats) - success_count} lettres en échec, à regénérer à la prochaine exécution")
+        self.timings.print_summary()
+        return exported and success_count == len(mandats)
 
 def main():
-    generator = MotivationLetterGenerator()
-    generator.run()
+    parser = argparse.ArgumentParser(description="Génère les lettres de motivation des mandats filtrés")
+    parser.add_argument('--concurrency', type=int, default=8, help="Nombre maximal de requêtes simultanées")
+    parser.add_argument('--rps', type=float, default=5.0, help="Débit maximal (requêtes par seconde)")
+    parser.add_argument('--api-url', help="URL de l'API de complétion (ex: serveur local de test)")
+    parser.add_argument('--no-cache', action='store_true', help="Ignorer le cache des réponses")
+    parser.add_argument('--batch', action='store_true', help="Soumettre les mandats sans lettre en un lot différé")
+    parser.add_argument('--fake-batch', action='store_true', help="Mode lot avec un transport hors ligne (tests)")
+    parser.add_argument('--poll', type=float, default=60, help="Intervalle de suivi du lot (secondes)")
+    parser.add_argument('--top-k', type=int, help="Ne générer que pour les K mandats les plus pertinents")
+    parser.add_argument('--min-score', type=float, help="Score de pertinence minimal (0 à 1)")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.setup(args)
+
+    generator = MotivationLetterGenerator(api_url=args.api_url, use_cache=not args.no_cache,
+                                          top_k=args.top_k, min_score=args.min_score)
+    try:
+        if args.batch or args.fake_batch:
+            generator.run_batch(fake=args.fake_batch, poll_interval=args.poll)
+        else:
+            generator.run(concurrency=args.concurrency, requests_per_second=args.rps)
+    finally:
+        instrumentation.finish(args, generator.timings, 'lettres')
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,217 @@
+"""Détection des mandats quasi identiques (republications sous un nouveau code)
+
+Chaque mandat reçoit une signature MinHash de ses 3-grammes de mots (titre et
+description, sans accents ni casse). Les signatures sont découpées en bandes
+(LSH). Seuls les représentants des groupes (leur premier mandat) sont indexés
+par bande: un nouveau mandat est comparé, sur la signature complète, une seule
+fois à chaque représentant qui partage une de ses bandes, et rejoint le groupe
+le plus proche au-delà du seuil. Un grand groupe de republications ne coûte
+donc qu'une comparaison.
+
+L'index est incrémental: seuls les mandats nouveaux ou dont le texte a changé
+sont signés.
+"""
+import hashlib
+import json
+import random
+import re
+from typing import Dict, List, Optional, Set
+
+from filter_rules import fold
+from mandat_repository import connect
+
+NUM_PERM = 64
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+# Similarité de Jaccard estimée à partir de laquelle deux mandats sont des doublons
+THRESHOLD = 0.8
+SHINGLE_SIZE = 3
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)
+PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+WORD_PATTERN = re.compile(r"\w+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS minhash (
+    code_mandat TEXT PRIMARY KEY,
+    text_hash TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    cluster TEXT NOT NULL,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_minhash_cluster ON minhash (cluster);
+CREATE TABLE IF NOT EXISTS minhash_bands (
+    band INTEGER NOT NULL,
+    bucket TEXT NOT NULL,
+    code_mandat TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, code_mandat)
+);
+CREATE INDEX IF NOT EXISTS idx_minhash_bands_code ON minhash_bands (code_mandat);
+"""
+
+
+def duplicate_text(mandat: Dict) -> str:
+    return f"{mandat.get('titre_mandat') or ''}\n{mandat.get('description_mandat') or ''}"
+
+
+def shingles(text: str) -> Set[int]:
+    words = WORD_PATTERN.findall(fold(text))
+    if len(words) < SHINGLE_SIZE:
+        words_grams = [" ".join(words)] if words else []
+    else:
+        words_grams = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    return {
+        int.from_bytes(hashlib.blake2b(gram.encode('utf-8'), digest_size=8).digest(), 'big')
+        for gram in words_grams
+    }
+
+
+def signature(text: str) -> Optional[List[int]]:
+    values = shingles(text)
+    if not values:
+        return None
+    return [min((a * value + b) % _PRIME for value in values) for a, b in PERMUTATIONS]
+
+
+def similarity(first: List[int], second: List[int]) -> float:
+    """Estimation de la similarité de Jaccard: part des positions égales"""
+    return sum(1 for x, y in zip(first, second) if x == y) / NUM_PERM
+
+
+def band_buckets(sig: List[int]) -> List[str]:
+    return [
+        hashlib.blake2b(json.dumps(sig[band * ROWS:(band + 1) * ROWS]).encode('ascii'), digest_size=8).hexdigest()
+        for band in range(BANDS)
+    ]
+
+
+class NearDuplicateIndex:
+    """Index MinHash/LSH des mandats, stocké dans mandats.db"""
+
+    def __init__(self, db_path: str = "mandats.db"):
+        self.conn = connect(db_path)
+        self.conn.executescript(SCHEMA)
+        # Index d'une version antérieure: les membres des groupes avaient aussi leurs bandes
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM minhash_bands WHERE code_mandat IN "
+                "(SELECT code_mandat FROM minhash WHERE cluster != code_mandat)"
+            )
+
+    def close(self):
+        self.conn.close()
+
+    def add(self, mandat: Dict, updated_at: Optional[str] = None, commit: bool = True) -> Optional[str]:
+        """Signe un mandat et renvoie le code du représentant de son groupe"""
+        code = mandat.get('code_mandat')
+        if not code:
+            return None
+        text = duplicate_text(mandat)
+        text_hash = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        row = self.conn.execute("SELECT text_hash, cluster FROM minhash WHERE code_mandat = ?", (code,)).fetchone()
+        if row and row['text_hash'] == text_hash:
+            self.conn.execute("UPDATE minhash SET updated_at = ? WHERE code_mandat = ?", (updated_at, code))
+            return row['cluster']
+
+        self.conn.execute("DELETE FROM minhash_bands WHERE code_mandat = ?", (code,))
+        sig = signature(text)
+        if sig is None:
+            # Texte sans mots à comparer: le mandat forme son propre groupe,
+            # sans bandes, et n'est resigné que s'il change
+            self.conn.execute(
+                "INSERT OR REPLACE INTO minhash (code_mandat, text_hash, signature, cluster, updated_at) "
+                "VALUES (?, ?, '', ?, ?)",
+                (code, text_hash, code, updated_at),
+            )
+            if commit:
+                self.conn.commit()
+            return code
+        buckets = band_buckets(sig)
+
+        cluster = code
+        best = THRESHOLD
+        # Groupes candidats, chacun comparé une seule fois par son représentant
+        candidates = {
+            candidate['cluster'] for band, bucket in enumerate(buckets)
+            for candidate in self.conn.execute(
+                "SELECT DISTINCT h.cluster AS cluster FROM minhash_bands b "
+                "JOIN minhash h ON h.code_mandat = b.code_mandat WHERE b.band = ? AND b.bucket = ?",
+                (band, bucket)
+            )
+        }
+        candidates.discard(code)
+        for candidate in candidates:
+            other = self.representative_signature(candidate)
+            if other is None:
+                continue
+            score = similarity(sig, other)
+            if score >= best:
+                best = score
+                cluster = candidate
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO minhash (code_mandat, text_hash, signature, cluster, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (code, text_hash, json.dumps(sig), cluster, updated_at),
+        )
+        if cluster == code:
+            # Nouveau représentant: seul mandat du groupe présent dans les bandes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO minhash_bands (band, bucket, code_mandat) VALUES (?, ?, ?)",
+                [(band, bucket, code) for band, bucket in enumerate(buckets)],
+            )
+        if commit:
+            self.conn.commit()
+        return cluster
+
+    def representative_signature(self, cluster: str) -> Optional[List[int]]:
+        """Signature du représentant du groupe (à défaut, d'un de ses membres)"""
+        row = self.conn.execute(
+            "SELECT signature FROM minhash WHERE code_mandat = ? AND cluster = ? AND signature != ''",
+            (cluster, cluster)
+        ).fetchone()
+        if row is None:
+            # Représentant re-signé dans un autre groupe: un membre restant le remplace
+            row = self.conn.execute(
+                "SELECT signature FROM minhash WHERE cluster = ? AND signature != '' LIMIT 1", (cluster,)
+            ).fetchone()
+        return json.loads(row['signature']) if row else None
+
+    def sync(self) -> int:
+        """Signe les mandats de la table mandats ajoutés ou modifiés depuis la dernière fois
+
+        Renvoie le nombre de doublons parmi ces mandats.
+        """
+        rows = self.conn.execute(
+            """
+            SELECT m.data AS data, m.updated_at AS updated_at FROM mandats m
+            LEFT JOIN minhash h ON h.code_mandat = m.code_mandat
+            WHERE h.code_mandat IS NULL OR h.updated_at IS NULL OR m.updated_at > h.updated_at
+            ORDER BY m.rowid
+            """
+        ).fetchall()
+        duplicates = 0
+        with self.conn:
+            for row in rows:
+                mandat = json.loads(row['data'])
+                cluster = self.add(mandat, updated_at=row['updated_at'], commit=False)
+                if cluster and cluster != mandat.get('code_mandat'):
+                    duplicates += 1
+        return duplicates
+
+    def cluster_of(self, code_mandat: str) -> Optional[str]:
+        row = self.conn.execute("SELECT cluster FROM minhash WHERE code_mandat = ?", (code_mandat,)).fetchone()
+        return row['cluster'] if row else None
+
+    def members(self, code_mandat: str) -> List[str]:
+        """Autres mandats du groupe de code_mandat"""
+        cluster = self.cluster_of(code_mandat)
+        if cluster is None:
+            return []
+        return [
+            row['code_mandat'] for row in self.conn.execute(
+                "SELECT code_mandat FROM minhash WHERE cluster = ? AND code_mandat != ? ORDER BY rowid",
+                (cluster, code_mandat)
+            )
+        ]
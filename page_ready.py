@@ -0,0 +1,52 @@
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Une page de mandat est prête lorsqu'elle affiche le code du mandat,
+# un message d'accès refusé, le formulaire de connexion ou la page d'expiration de session
+MANDAT_PAGE_XPATH = (
+    "//label[contains(text(), 'Code du mandat')]"
+    " | //h3[contains(text(), 'avez pas accès')]"
+    " | //*[contains(concat(' ', normalize-space(@class), ' '), ' t-Alert--danger ')]"
+    " | //*[contains(text(), 'Accès refusé par le contrôle de sécurité')]"
+    " | //input[@type='password']"
+    " | //*[contains(text(), 'session a expiré') or contains(text(), 'Your session has ended')]"
+)
+
+LISTING_XPATH = "//tr[.//a[contains(@href, 'mandat')]]"
+
+LOGIN_FORM_XPATH = "//input[@type='password']"
+
+# Un seul aller-retour WebDriver par vérification: document chargé, aucune
+# requête AJAX APEX en cours et élément attendu présent dans le DOM
+READY_SCRIPT = """
+if (document.readyState !== 'complete') { return false; }
+if (window.apex && apex.jQuery && apex.jQuery.active > 0) { return false; }
+if (document.querySelector('.u-Processing')) { return false; }
+return document.evaluate('count(' + arguments[0] + ') > 0', document, null,
+                         XPathResult.BOOLEAN_TYPE, null).booleanValue;
+"""
+
+POLL_INTERVAL = 0.05
+
+
+def wait_until_ready(driver, xpath: str, timeout: float) -> bool:
+    """Attend que la page APEX soit au repos et contienne l'élément attendu"""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=POLL_INTERVAL).until(
+            lambda d: d.execute_script(READY_SCRIPT, xpath)
+        )
+        return True
+    except TimeoutException:
+        return False
+
+
+def wait_for_mandat_page(driver, timeout: float) -> bool:
+    return wait_until_ready(driver, MANDAT_PAGE_XPATH, timeout)
+
+
+def wait_for_listing(driver, timeout: float) -> bool:
+    return wait_until_ready(driver, LISTING_XPATH, timeout)
+
+
+def wait_for_login_form(driver, timeout: float) -> bool:
+    return wait_until_ready(driver, LOGIN_FORM_XPATH, timeout)
@@ -1,18 +1,81 @@
 from fpdf import FPDF
+import argparse
+import copy
+import hashlib
+import io
 import json
 import os
 import time
-from typing import Dict, List
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
 from fpdf.enums import Align
+from fontTools.ttLib import TTFont
+
+import instrumentation
+from instrumentation import StageTimings
+from letter_store import LetterStore
+from text_normalize import clean_pdf_text
+
+FONT_FAMILY = "DejaVu"
+FONT_FILES = {
+    "": "ttf/DejaVuSansCondensed.ttf",
+    "B": "ttf/DejaVuSansCondensed-Bold.ttf",
+    "I": "ttf/DejaVuSansCondensed-Oblique.ttf",
+}
+
+# Polices analysées une seule fois par processus. Chaque document en reçoit une
+# copie: fpdf2 partage les métriques (largeurs, cmap) et ne copie que l'état
+# propre au document (sous-ensemble de glyphes utilisés).
+_font_cache = {}
+_font_bytes = {}
+
+
+def load_fonts() -> Dict:
+    """Analyse les fichiers TTF au premier appel puis renvoie les polices en cache"""
+    if not _font_cache:
+        template = FPDF()
+        for style, path in FONT_FILES.items():
+            template.add_font(FONT_FAMILY, style, path, uni=True)
+        _font_cache.update(template.fonts)
+        for fontkey, font in _font_cache.items():
+            with open(font.ttffile, 'rb') as f:
+                _font_bytes[fontkey] = f.read()
+    return _font_cache
+
+
+def copy_font(fontkey: str, font):
+    """Copie d'une police en cache utilisable par un nouveau document
+
+    fpdf2 partage l'objet fontTools entre les copies, mais output() le réduit
+    au sous-ensemble de glyphes du document: chaque copie reçoit donc son
+    propre objet, relu paresseusement depuis les octets gardés en mémoire.
+    """
+    font_copy = copy.deepcopy(font)
+    font_copy.ttfont = TTFont(io.BytesIO(_font_bytes[fontkey]), recalcTimestamp=False, lazy=True)
+    return font_copy
+
+
+_font_digest = None
+
+
+def font_digest() -> str:
+    """Empreinte du contenu des fichiers TTF (calculée une fois par processus)"""
+    global _font_digest
+    if _font_digest is None:
+        digest = hashlib.sha256()
+        for style, path in sorted(FONT_FILES.items()):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        _font_digest = digest.hexdigest()
+    return _font_digest
 
 class CustomPDF(FPDF):
     def __init__(self):
         super().__init__()
         self.set_auto_page_break(auto=True, margin=15)
-        # Ajout de la police DejaVu
-        self.add_font("DejaVu", "", "ttf/DejaVuSansCondensed.ttf", uni=True)
-        self.add_font("DejaVu", "B", "ttf/DejaVuSansCondensed-Bold.ttf", uni=True)
-        self.add_font("DejaVu", "I", "ttf/DejaVuSansCondensed-Oblique.ttf", uni=True)
+        # Ajout de la police DejaVu (copie des polices en cache)
+        for fontkey, font in load_fonts().items():
+            self.fonts[fontkey] = copy_font(fontkey, font)
 
     def header(self):
         self.set_font('DejaVu', 'B', 12)
@@ -42,6 +105,8 @@ class PDFGenerator:
     def __init__(self):
         self.input_file = "lettres_motivation.json"
         self.output_dir = "lettres_de_motivation"
+        # Empreinte des entrées de chaque PDF produit, par code_mandat
+        self.manifest_file = os.path.join(self.output_dir, "manifest.json")
         
         self.pdf_config = {
             'font_family': 'DejaVu',
@@ -55,36 +120,19 @@ class PDFGenerator:
             'margin_bottom': 20
         }
         
+        self.timings = StageTimings()
         os.makedirs(self.output_dir, exist_ok=True)
 
     def clean_text(self, text: str) -> str:
         """Nettoie le texte pour le rendre compatible avec FPDF"""
-        char_mapping = {
-            '–': '-',
-            '—': '-',
-            "'": "'",
-            '"': '"',
-            '"': '"',
-            '…': '...',
-            '\u2013': '-',
-            '\u2014': '-',
-            '\u2018': "'",
-            '\u2019': "'",
-            '\u201c': '"',
-            '\u201d': '"',
-            '\u2022': '•',
-            '\u2026': '...',
-            '\u00A0': ' ',
-            '\u202F': ' ',
-        }
-        
-        for old, new in char_mapping.items():
-            text = text.replace(old, new)
-            
-        return text
+        return clean_pdf_text(text)
 
     def create_pdf(self, letter_data: Dict) -> str:
         """Crée un fichier PDF formaté pour la lettre de motivation"""
+        with self.timings.measure('render', code_mandat=letter_data.get('code_mandat')):
+            return self._create_pdf(letter_data)
+
+    def _create_pdf(self, letter_data: Dict) -> str:
         try:
             pdf = CustomPDF()
             pdf.add_page()
@@ -117,8 +165,7 @@ class PDFGenerator:
                             line_height=self.pdf_config['line_height']
                         )
             
-            safe_employer = "".join(x for x in letter_data['employeur'] if x.isalnum() or x in (' ', '-', '_'))
-            filename = f"{self.output_dir}/lettre_motivation_{safe_employer}_{letter_data['code_mandat']}.pdf"
+            filename = self.pdf_filename(letter_data)
             
             pdf.output(filename)
             return filename
@@ -127,36 +174,174 @@ class PDFGenerator:
             print(f"Erreur lors de la création du PDF pour le mandat {letter_data['code_mandat']}: {str(e)}")
             return None
 
-    def load_letters(self) -> List[Dict]:
-        """Charge les lettres depuis le fichier JSON"""
+    def pdf_filename(self, letter_data: Dict) -> str:
+        safe_employer = "".join(x for x in letter_data['employeur'] if x.isalnum() or x in (' ', '-', '_'))
+        return f"{self.output_dir}/lettre_motivation_{safe_employer}_{letter_data['code_mandat']}.pdf"
+
+    def input_hash(self, letter_data: Dict) -> str:
+        """Empreinte de tout ce qui détermine le PDF: texte de la lettre, configuration et polices"""
+        canonical = json.dumps({
+            'code_mandat': letter_data.get('code_mandat'),
+            'employeur': letter_data.get('employeur'),
+            'lettre_de_motivation': letter_data.get('lettre_de_motivation'),
+            'pdf_config': self.pdf_config,
+            'polices': font_digest()
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def load_manifest(self) -> Dict[str, Dict]:
         try:
-            with open(self.input_file, 'r', encoding='utf-8') as f:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
                 return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save_manifest(self, manifest: Dict[str, Dict]):
+        tmp_path = self.manifest_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_file)
+
+    def is_up_to_date(self, manifest: Dict[str, Dict], letter_data: Dict) -> bool:
+        """Vrai si le PDF existe et a été rendu à partir des mêmes entrées"""
+        entry = manifest.get(letter_data.get('code_mandat'))
+        return bool(entry) and entry.get('empreinte') == self.input_hash(letter_data) \
+            and os.path.exists(entry.get('fichier', ''))
+
+    def record_pdf(self, manifest: Dict[str, Dict], letter_data: Dict, pdf_path: str):
+        manifest[letter_data['code_mandat']] = {
+            'fichier': pdf_path,
+            'empreinte': self.input_hash(letter_data)
+        }
+
+    def load_letters(self) -> List[Dict]:
+        """Charge les lettres depuis la table lettres (l'ancien fichier JSON est importé au besoin)"""
+        try:
+            store = LetterStore("mandats.db", legacy_json=self.input_file)
+            try:
+                return list(store.iter_all())
+            finally:
+                store.close()
         except Exception as e:
             print(f"Erreur lors du chargement des lettres: {str(e)}")
             return []
 
-    def generate_all_pdfs(self):
-        """Génère les PDFs pour toutes les lettres"""
+    def generate_all_pdfs(self, workers: int = 1, force: bool = False, print_summary: bool = True) -> bool:
+        """Génère les PDFs des lettres dont le texte, la configuration ou les polices ont changé
+
+        Renvoie False si au moins un PDF n'a pas pu être créé. print_summary=False
+        laisse l'affichage des durées à l'appelant qui partage les mesures.
+        """
         letters = self.load_letters()
         if not letters:
-            print("Aucune lettre trouvée dans le fichier JSON")
-            return
+            print("Aucune lettre trouvée")
+            return True
+
+        manifest = self.load_manifest()
+        if not force:
+            total = len(letters)
+            letters = [letter for letter in letters if not self.is_up_to_date(manifest, letter)]
+            if total > len(letters):
+                print(f"{total - len(letters)} PDFs déjà à jour ignorés")
+            if not letters:
+                print("Tous les PDFs sont à jour")
+                return True
 
         print(f"Génération de {len(letters)} PDFs...")
         
-        for i, letter in enumerate(letters, 1):
-            print(f"\nTraitement de la lettre {i}/{len(letters)} - Mandat: {letter['code_mandat']}")
-            pdf_path = self.create_pdf(letter)
+        try:
+            if workers > 1:
+                return self.generate_parallel(letters, workers, manifest) == len(letters)
             
-            if pdf_path:
-                print(f"PDF créé avec succès: {pdf_path}")
-            else:
-                print(f"Échec de la création du PDF pour le mandat {letter['code_mandat']}")
+            success_count = 0
+            for i, letter in enumerate(letters, 1):
+                print(f"\nTraitement de la lettre {i}/{len(letters)} - Mandat: {letter['code_mandat']}")
+                pdf_path = self.create_pdf(letter)
+                
+                if pdf_path:
+                    success_count += 1
+                    self.record_pdf(manifest, letter, pdf_path)
+                    print(f"PDF créé avec succès: {pdf_path}")
+                else:
+                    print(f"Échec de la création du PDF pour le mandat {letter['code_mandat']}")
+            return success_count == len(letters)
+        finally:
+            self.save_manifest(manifest)
+            if print_summary:
+                self.timings.print_summary()
+
+    def generate_parallel(self, letters: List[Dict], workers: int, manifest: Optional[Dict[str, Dict]] = None) -> int:
+        """Rend les lettres dans un pool de processus; un échec n'affecte que sa lettre
+
+        Renvoie le nombre de PDFs créés.
+        """
+        start = time.perf_counter()
+        success_count = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_render_worker) as executor:
+            futures = {executor.submit(render_letter, letter): letter for letter in letters}
+            for i, future in enumerate(as_completed(futures), 1):
+                letter = futures[future]
+                try:
+                    # Le rendu est mesuré dans le worker: ses propres mesures sont perdues
+                    pdf_path, seconds = future.result()
+                    self.timings.record('render', seconds, code_mandat=letter.get('code_mandat'))
+                except Exception as e:
+                    print(f"Erreur du worker pour le mandat {letter.get('code_mandat')}: {str(e)}")
+                    pdf_path = None
+                
+                if pdf_path:
+                    success_count += 1
+                    if manifest is not None:
+                        self.record_pdf(manifest, letter, pdf_path)
+                    print(f"PDF {i}/{len(letters)} créé avec succès: {pdf_path}")
+                else:
+                    print(f"Échec de la création du PDF pour le mandat {letter.get('code_mandat')}")
+        
+        print(f"\n{success_count}/{len(letters)} PDFs créés en {time.perf_counter() - start:.1f}s "
+              f"avec {workers} processus")
+        return success_count
+
+
+_worker_generator: Optional[PDFGenerator] = None
+
+
+def init_render_worker():
+    """Initialise un processus de rendu: générateur et polices chargés une seule fois"""
+    global _worker_generator
+    _worker_generator = PDFGenerator()
+    load_fonts()
+
+
+def render_letter(letter_data: Dict) -> Tuple[Optional[str], float]:
+    """Rend une lettre dans un processus initialisé par init_render_worker
+
+    Renvoie le chemin du PDF et la durée du rendu, que le processus principal
+    enregistre (étape « render »); le profil éventuel est enregistré pour
+    être fusionné par instrumentation.write_profiles.
+    """
+    if _worker_generator is None:
+        init_render_worker()
+    start = time.perf_counter()
+    with instrumentation.profile('render'):
+        pdf_path = _worker_generator._create_pdf(letter_data)
+    seconds = time.perf_counter() - start
+    instrumentation.save_worker_profiles()
+    return pdf_path, seconds
+
 
 def main():
+    parser = argparse.ArgumentParser(description="Génère les PDFs des lettres de motivation")
+    parser.add_argument('--workers', type=int, default=1, help="Nombre de processus de rendu")
+    parser.add_argument('--force', action='store_true', help="Régénère tous les PDFs, même ceux déjà à jour")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.setup(args)
+
     generator = PDFGenerator()
-    generator.generate_all_pdfs()
+    try:
+        generator.generate_all_pdfs(workers=args.workers, force=args.force)
+    finally:
+        instrumentation.finish(args, generator.timings, 'pdf')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""Score de pertinence des mandats par rapport au profil du candidat (TF-IDF local)
+
+Les fréquences de termes de chaque mandat sont conservées dans mandats.db,
+indexées par l'empreinte du texte: seuls les mandats nouveaux ou modifiés
+sont retokenisés. Les poids IDF sont recalculés sur l'ensemble considéré.
+"""
+import hashlib
+import json
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from filter_rules import fold
+from mandat_repository import connect
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS relevance_terms (
+    code_mandat TEXT PRIMARY KEY,
+    text_hash TEXT NOT NULL,
+    terms TEXT NOT NULL
+);
+"""
+
+TEXT_FIELDS = ('titre_mandat', 'specialites', 'description_mandat', 'exigences_mandat', 'niveau_etudes')
+WORD_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*")
+STOPWORDS = frozenset("""
+a au aux avec ce ces dans de des du elle en et eux il je la le les leur lui ma mais me meme mes moi mon
+ne nos notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos votre
+vous c d j l m n s t y ete etre est sont sera avoir a ont etc afin ainsi comme dont plus tout tous toute
+toutes cette cet leurs selon entre sans sous chez lors the and of to in for with
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in WORD_PATTERN.findall(fold(text)) if len(word) > 1 and word not in STOPWORDS]
+
+
+def mandat_text(mandat: Dict) -> str:
+    return "\n".join(str(mandat.get(field) or '') for field in TEXT_FIELDS)
+
+
+def profile_from_prompt(system_prompt: str) -> str:
+    """Section PROFIL DU CANDIDAT du prompt système (tout le prompt si elle est introuvable)"""
+    match = re.search(r"PROFIL DU CANDIDAT\s*:(.*?)DIRECTIVES", system_prompt, re.S)
+    return match.group(1) if match else system_prompt
+
+
+class RelevanceScorer:
+    """Classe les mandats par similarité cosinus TF-IDF avec le profil"""
+
+    def __init__(self, profile_text: str, db_path: str = "mandats.db"):
+        self.profile_terms = Counter(tokenize(profile_text))
+        self.conn = connect(db_path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def term_counts(self, mandats: List[Dict]) -> List[Counter]:
+        """Fréquences de termes de chaque mandat, lues en cache quand le texte n'a pas changé"""
+        codes = [mandat.get('code_mandat') for mandat in mandats if mandat.get('code_mandat')]
+        cached = {
+            row['code_mandat']: (row['text_hash'], row['terms'])
+            for row in self.conn.execute(
+                "SELECT code_mandat, text_hash, terms FROM relevance_terms "
+                "WHERE code_mandat IN (SELECT value FROM json_each(?))",
+                (json.dumps(codes, ensure_ascii=False),)
+            )
+        }
+        counts = []
+        updates = []
+        for mandat in mandats:
+            text = mandat_text(mandat)
+            text_hash = hashlib.sha1(text.encode('utf-8')).hexdigest()
+            code = mandat.get('code_mandat')
+            entry = cached.get(code)
+            if entry and entry[0] == text_hash:
+                counts.append(Counter(json.loads(entry[1])))
+                continue
+            terms = Counter(tokenize(text))
+            counts.append(terms)
+            if code:
+                updates.append((code, text_hash, json.dumps(terms, ensure_ascii=False)))
+
+        if updates:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO relevance_terms (code_mandat, text_hash, terms) VALUES (?, ?, ?)",
+                    updates
+                )
+        return counts
+
+    def score(self, mandats: List[Dict]) -> List[Tuple[float, Dict]]:
+        """(score, mandat) triés du plus pertinent au moins pertinent"""
+        counts = self.term_counts(mandats)
+        document_frequency = Counter()
+        for terms in counts:
+            document_frequency.update(terms.keys())
+        total = len(counts) + 1
+
+        def weights(terms: Counter) -> Dict[str, float]:
+            return {
+                term: (1 + math.log(count)) * math.log(total / (1 + document_frequency[term]) + 1)
+                for term, count in terms.items()
+            }
+
+        profile = weights(self.profile_terms)
+        profile_norm = math.sqrt(sum(w * w for w in profile.values())) or 1.0
+
+        scored = []
+        for mandat, terms in zip(mandats, counts):
+            vector = weights(terms)
+            norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+            dot = sum(w * profile[term] for term, w in vector.items() if term in profile)
+            scored.append((dot / (norm * profile_norm), mandat))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored
+
+    def select(self, mandats: List[Dict], top_k: Optional[int] = None,
+               min_score: Optional[float] = None) -> List[Dict]:
+        """Mandats retenus: au plus top_k, avec un score d'au moins min_score"""
+        scored = self.score(mandats)
+        if min_score is not None:
+            scored = [(score, mandat) for score, mandat in scored if score >= min_score]
+        if top_k is not None:
+            scored = scored[:top_k]
+        for score, mandat in scored[:10]:
+            print(f"  {score:.3f}  {mandat.get('code_mandat')} - {mandat.get('titre_mandat')}")
+        return [mandat for _, mandat in scored]
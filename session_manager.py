@@ -0,0 +1,151 @@
+"""Session du portail partagée par le navigateur principal, le pool et le client HTTP
+
+La session APEX expire au bout d'un moment: le portail redirige alors vers le
+formulaire de connexion ou affiche une page d'expiration. Le premier worker
+qui le constate se reconnecte avec le navigateur principal, sous un verrou;
+les autres attendent puis reprennent la nouvelle session (cookies et
+identifiant « session= » des URL) sans se reconnecter à leur tour.
+"""
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+import mandat_parser
+import page_ready
+from driver_pool import COOKIE_KEYS
+
+# Champs du formulaire de connexion (imbrication du thème APEX du portail)
+USERNAME_XPATH = "/html/body/div[3]/main/div/div[2]/section/div/div[2]/form/h3/section[1]/div/label/input"
+PASSWORD_XPATH = "/html/body/div[3]/main/div/div[2]/section/div/div[2]/form/h3/section[2]/div/div[1]/label/input"
+LOGIN_BUTTON_XPATH = "/html/body/div[3]/main/div/div[2]/section/div/div[2]/form/h3/div[1]/button"
+
+SESSION_PARAM = 'session'
+
+
+class SessionExpired(Exception):
+    """Le portail a renvoyé le formulaire de connexion ou la page d'expiration"""
+
+
+def session_id_from_url(url: str) -> Optional[str]:
+    return dict(parse_qsl(urlsplit(url).query)).get(SESSION_PARAM) or None
+
+
+class SessionManager:
+    """Connexion au portail, détection de l'expiration et reconnexion unique"""
+
+    def __init__(self, login_url: str, credentials: Dict, wait_time: float):
+        self.login_url = login_url
+        self.credentials = credentials
+        self.wait_time = wait_time
+        self.driver = None
+        self.session_id = session_id_from_url(login_url)
+        self.cookies: List[Dict] = []
+        # Incrémenté à chaque connexion: un worker compare la génération vue
+        # avant sa requête pour savoir si un autre s'est déjà reconnecté
+        self.generation = 0
+        self.renewals = 0
+        self._lock = threading.RLock()
+
+    def attach(self, driver):
+        """Navigateur principal, utilisé pour se connecter"""
+        self.driver = driver
+
+    def login(self) -> bool:
+        """Remplit le formulaire de connexion avec le navigateur principal"""
+        with self._lock:
+            return self._login()
+
+    def _login(self) -> bool:
+        driver = self.driver
+        try:
+            # Accéder à la page de login et attendre le formulaire
+            driver.get(self.login_url)
+            page_ready.wait_for_login_form(driver, self.wait_time)
+            form_url = driver.current_url
+
+            wait = WebDriverWait(driver, self.wait_time)
+            username_field = wait.until(EC.presence_of_element_located((By.XPATH, USERNAME_XPATH)))
+            username_field.clear()
+            username_field.send_keys(self.credentials['username'])
+
+            password_field = wait.until(EC.presence_of_element_located((By.XPATH, PASSWORD_XPATH)))
+            password_field.clear()
+            password_field.send_keys(self.credentials['password'])
+
+            wait.until(EC.element_to_be_clickable((By.XPATH, LOGIN_BUTTON_XPATH))).click()
+
+            # Connexion réussie: le portail quitte le formulaire
+            try:
+                wait.until(lambda d: d.current_url != form_url
+                           and not d.find_elements(By.XPATH, page_ready.LOGIN_FORM_XPATH))
+            except TimeoutException:
+                print("La connexion a échoué")
+                return False
+
+            self.session_id = session_id_from_url(driver.current_url) or self.session_id
+            self.cookies = driver.get_cookies()
+            self.generation += 1
+            driver.session_generation = self.generation
+            print("Connexion réussie!")
+            return True
+
+        except Exception as e:
+            print(f"Erreur lors de la connexion: {e}")
+            return False
+
+    def renew(self, seen_generation: int) -> bool:
+        """Reconnexion après une expiration constatée avec la session seen_generation
+
+        Un seul worker se reconnecte; ceux qui arrivent ensuite trouvent une
+        génération plus récente et repartent avec la nouvelle session.
+        """
+        with self._lock:
+            if self.generation != seen_generation:
+                return True
+            if self.driver is None:
+                return False
+            print("Session expirée, nouvelle connexion...")
+            self.renewals += 1
+            return self._login()
+
+    def is_expired(self, tree, url: Optional[str] = None) -> bool:
+        """Vrai si la page est le formulaire de connexion ou la page d'expiration de session"""
+        if url and urlsplit(url).path.rstrip('/').endswith('/login'):
+            return True
+        return mandat_parser.is_session_expired(tree)
+
+    def session_url(self, url: str, add: bool = False) -> str:
+        """URL avec l'identifiant de la session courante (ajouté si add, sinon remplacé s'il est présent)"""
+        if not self.session_id:
+            return url
+        parts = urlsplit(url)
+        params = parse_qsl(parts.query, keep_blank_values=True)
+        if not add and not any(key == SESSION_PARAM for key, _ in params):
+            return url
+        params = [(key, value) for key, value in params if key != SESSION_PARAM]
+        params.append((SESSION_PARAM, self.session_id))
+        return urlunsplit(parts._replace(query=urlencode(params)))
+
+    def listing_url(self) -> str:
+        return self.session_url(self.login_url, add=True)
+
+    def on_listing(self, url: str) -> bool:
+        """Vrai si url est la page de la liste (quel que soit l'identifiant de session)"""
+        return urlsplit(url).path == urlsplit(self.login_url).path
+
+    def sync_driver(self, driver):
+        """Copie les cookies de la session courante dans un navigateur du pool, si besoin"""
+        if getattr(driver, 'session_generation', None) == self.generation:
+            return
+        with self._lock:
+            cookies = list(self.cookies)
+            generation = self.generation
+        driver.delete_all_cookies()
+        for cookie in cookies:
+            driver.add_cookie({key: value for key, value in cookie.items() if key in COOKIE_KEYS})
+        driver.session_generation = generation
@@ -1,385 +1,480 @@
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
+import argparse
 import time
-import json
-import html
-import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from config.credentials import CredentialsManager
+from mandat_store import MandatStore
+from mandat_repository import MandatRepository
+from crawl_queue import CrawlQueue
+from driver_pool import DriverPool, RequestThrottle
+from http_fetch import HttpMandatFetcher
+import mandat_parser
+import page_ready
+import mandat_listing
+import instrumentation
+from instrumentation import StageTimings
+from text_normalize import clean_portal_text
+from session_manager import SessionExpired, SessionManager
 from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import WebDriverException
+
+
+# Sans identifiant de session: SessionManager ajoute celui obtenu à la connexion
+LOGIN_URL = "https://laruche.polymtl.ca/sp/ssp/r/etudiant/recherche-mandats?p40_type_recherche=C"
 
 
 class PortalScraper:
-    def __init__(self):
-        self.credentials_manager = CredentialsManager()
+    def __init__(self, credentials_manager=None, login_url=None):
+        # login_url permet de viser un autre serveur (portail de test, voir mock/laruche_portal.py)
+        self.credentials_manager = credentials_manager or CredentialsManager()
         self.credentials = self.credentials_manager.get_credentials()
-        self.login_url = "https://laruche.polymtl.ca/sp/ssp/r/etudiant/recherche-mandats?p40_type_recherche=C&session=4571910543658"
+        self.settings = self.credentials_manager.get_settings()
+        self.login_url = login_url or LOGIN_URL
         self.driver = None
-        self.wait_time = 2
-        self.mandats_file = "mandats.json"
+        # Client HTTP gardé d'un parcours à l'autre (connexions keep-alive)
+        self.http_fetcher = None
+        self.wait_time = self.settings['wait_time']
+        self.timings = StageTimings()
+        self.session = SessionManager(self.login_url, self.credentials, self.wait_time)
+        self.legacy_mandats_file = "mandats.json"
+        self.store = MandatStore("mandats.jsonl")
+        self.store.migrate_from_json(self.legacy_mandats_file)
+        self.repository = MandatRepository("mandats.db")
+        # File persistante du parcours en cours (reprise après un arrêt)
+        self.crawl_queue = CrawlQueue("mandats.db")
+        self.run_id = None
+        self.resume = True
         self.processed_mandats = self.load_processed_mandats()
 
     def setup_driver(self):
         """Initialise le navigateur"""
         options = webdriver.ChromeOptions()
-        # options.add_argument('--headless')  # Décommenter pour exécuter sans interface graphique
+        if self.settings['headless']:
+            options.add_argument('--headless=new')
         self.driver = webdriver.Chrome(options=options)
         self.driver.maximize_window()
+        self.session.attach(self.driver)
 
     def login(self):
         """Gère la connexion au portail"""
-        try:
-            # Accéder à la page de login
-            self.driver.get(self.login_url)
-            time.sleep(2)  # Attendre le chargement initial
-            
-            # Définir les XPath
-            username_xpath = "/html/body/div[3]/main/div/div[2]/section/div/div[2]/form/h3/section[1]/div/label/input"
-            password_xpath = "/html/body/div[3]/main/div/div[2]/section/div/div[2]/form/h3/section[2]/div/div[1]/label/input"
-            login_button_xpath = "/html/body/div[3]/main/div/div[2]/section/div/div[2]/form/h3/div[1]/button"
-            
-            # Attendre que les éléments soient présents
-            wait = WebDriverWait(self.driver, self.wait_time)
-            
-            # Trouver et remplir le champ username
-            username_field = wait.until(
-                EC.presence_of_element_located((By.XPATH, username_xpath))
-            )
-            username_field.clear()
-            time.sleep(0.5)
-            username_field.send_keys(self.credentials['username'])
+        with self.timings.measure('login'):
+            return self.session.login()
 
-            
-            # Trouver et remplir le champ password
-            password_field = wait.until(
-                EC.presence_of_element_located((By.XPATH, password_xpath))
-            )
-            password_field.clear()
-            time.sleep(0.5)
-            password_field.send_keys(self.credentials['password'])
+    def restart_driver(self):
+        """Relance le navigateur (plantage de Chrome ou session inutilisable)"""
+        if self.driver:
+            try:
+                self.driver.quit()
+            except Exception as e:
+                print(f"Erreur lors de la fermeture du navigateur: {e}")
+        self.setup_driver()
 
-            
-            # Trouver et cliquer sur le bouton de connexion
-            login_button = wait.until(
-                EC.element_to_be_clickable((By.XPATH, login_button_xpath))
-            )
-            time.sleep(0.5)
-            login_button.click()
-            
-            # Vérifier si la connexion a réussi
+    def relogin_if_expired(self):
+        """Se reconnecte si le portail renvoie le formulaire de connexion ou la page d'expiration"""
+        generation = self.session.generation
+        self.driver.get(self.session.listing_url())
+        page_ready.wait_until_ready(
+            self.driver, f"{page_ready.LISTING_XPATH} | {page_ready.MANDAT_PAGE_XPATH}", self.wait_time
+        )
+        if self.session.is_expired(mandat_parser.parse_html(self.driver.page_source), self.driver.current_url):
+            with self.timings.measure('login'):
+                return self.session.renew(generation)
+        return True
+
+    def crawl(self, max_restarts: int = 2):
+        """Connexion et extraction; après une erreur, le navigateur est relancé et le parcours repris"""
+        for attempt in range(max_restarts + 1):
+            if attempt:
+                print(f"\nRedémarrage du navigateur ({attempt}/{max_restarts})...")
+                try:
+                    self.restart_driver()
+                except Exception as e:
+                    print(f"Impossible de relancer le navigateur: {e}")
+                    continue
+            # Session déjà ouverte (mode démon): reconnexion seulement si elle a expiré
             try:
-                # Attendre que l'URL change
-                wait.until(lambda driver: driver.current_url != self.login_url)
-                print("Connexion réussie!")
+                logged_in = self.relogin_if_expired() if self.session.generation else self.login()
+            except WebDriverException as e:
+                # Navigateur injoignable (Chrome fermé entre deux cycles): relancé à la tentative suivante
+                print(f"Navigateur inutilisable: {e}")
+                continue
+            if not logged_in:
+                print("Échec de la connexion")
+                continue
+            print("Connexion réussie! Début de l'extraction des mandats...")
+            if self.extract_mandats():
                 return True
-            except TimeoutException:
-                print("La connexion a échoué")
-                return False
-
-        except Exception as e:
-            print(f"Erreur lors de la connexion: {e}")
-            return False
+        return False
 
     def close(self):
         """Ferme le navigateur"""
         if self.driver:
             self.driver.quit()
+        if self.http_fetcher:
+            self.http_fetcher.close()
+        self.store.close()
+        self.repository.close()
+        self.crawl_queue.close()
 
     def load_processed_mandats(self):
         """Charge la liste des mandats déjà traités"""
-        try:
-            with open(self.mandats_file, 'r') as f:
-                data = json.load(f)
-                processed = set()
-                
-                # Parcourir chaque mandat de façon sécurisée
-                for mandat in data:
-                    if isinstance(mandat, dict):
-                        # Essayer différentes clés possibles pour le code
-                        code = mandat.get('code_mandat') or mandat.get('code') or mandat.get('id')
-                        if code:
-                            processed.add(str(code))
-                
-                print(f"Chargement de {len(processed)} mandats déjà traités")
-                return processed
-                
-        except FileNotFoundError:
+        if not self.store.exists():
             print("Aucun fichier de mandats existant trouvé. Création d'un nouveau fichier.")
             return set()
-        except json.JSONDecodeError:
-            print("Erreur de lecture du fichier JSON. Création d'un nouveau fichier.")
-            return set()
+
+        try:
+            processed = set()
+
+            # Lecture en flux: une ligne JSON par mandat
+            for mandat in self.store.iter_mandats():
+                # Essayer différentes clés possibles pour le code
+                code = mandat.get('code_mandat') or mandat.get('code') or mandat.get('id')
+                if code:
+                    processed.add(str(code))
+
+            print(f"Chargement de {len(processed)} mandats déjà traités")
+            return processed
+
         except Exception as e:
             print(f"Erreur lors du chargement des mandats: {str(e)}")
             return set()
 
-    def save_mandat(self, mandat_data):
-        """Sauvegarde un mandat dans le fichier JSON"""
-        try:
-            try:
-                with open(self.mandats_file, 'r') as f:
-                    mandats = json.load(f)
-            except FileNotFoundError:
-                mandats = []
-            
-            mandats.append(mandat_data)
-            
-            with open(self.mandats_file, 'w', encoding='utf-8') as f:
-                json.dump(mandats, f, ensure_ascii=False, indent=2)
-            
-            self.processed_mandats.add(mandat_data['code_mandat'])
+    def harvest_links(self):
+        """Récupère les liens des mandats affichés dans la liste
+
+        Renvoie (liens, complete): complete est faux si la liste n'a pas été
+        lue jusqu'à sa dernière page.
+        """
+        with self.timings.measure('listing'):
+            return self._harvest_links()
+
+    def _harvest_links(self):
+        # S'assurer que nous sommes sur la bonne page
+        if not self.session.on_listing(self.driver.current_url):
+            print("Retour à la page principale...")
+            self.driver.get(self.session.listing_url())
+        
+        # Attendre que le tableau soit chargé (après reconnexion si la session a expiré)
+        if not page_ready.wait_for_listing(self.driver, self.wait_time):
+            if not self.relogin_if_expired() or not page_ready.wait_for_listing(self.driver, self.wait_time):
+                print("Aucun mandat affiché dans la liste")
+                return [], False
+        
+        # Demander le plus grand nombre de lignes par page
+        if self.settings['jobs_per_page']:
+            rows_per_page = mandat_listing.set_rows_per_page(
+                self.driver, self.settings['jobs_per_page'], self.wait_time
+            )
+            if rows_per_page:
+                print(f"Affichage de {rows_per_page} mandats par page")
+        
+        links = []
+        seen_codes = set()
+        for page in range(1, mandat_listing.MAX_PAGES + 1):
+            rows = mandat_listing.harvest_rows(self.driver)
+            new_rows = [link_data for link_data in rows if link_data['code'] not in seen_codes]
+            if not new_rows:
+                return links, True
+            
+            for link_data in new_rows:
+                seen_codes.add(link_data['code'])
+                link_data['fingerprint'] = mandat_parser.listing_fingerprint(link_data)
+                links.append(link_data)
+            print(f"Page {page} de la liste: {len(new_rows)} mandats")
             
-        except Exception as e:
-            print(f"Erreur lors de la sauvegarde du mandat: {e}")
+            try:
+                if not mandat_listing.goto_next_page(self.driver, rows[0]['code'], self.wait_time):
+                    return links, True
+            except mandat_listing.ListingIncomplete as e:
+                print(f"Liste incomplète: {e}")
+                return links, False
+        
+        print(f"Liste incomplète: plus de {mandat_listing.MAX_PAGES} pages")
+        return links, False
 
     def extract_mandats(self):
         try:
-            wait = WebDriverWait(self.driver, self.wait_time)
-            
-            # S'assurer que nous sommes sur la bonne page
-            if not self.driver.current_url.startswith(self.login_url):
-                print("Retour à la page principale...")
-                self.driver.get(self.login_url)
-                time.sleep(0.5)
-            
-            # Attendre que le tableau soit chargé
-            table_rows = wait.until(EC.presence_of_all_elements_located(
-                (By.XPATH, "//tr[.//a[contains(@href, 'mandat')]]")
-            ))
-            
-            main_window = self.driver.current_window_handle
-            
-            links = []
-            for row in table_rows:
-                try:
-                    link_element = row.find_element(By.XPATH, ".//a[contains(@href, 'mandat')]")
-                    code_mandat = row.find_element(By.XPATH, "./td[1]").text.strip()
-                    
-                    href = link_element.get_attribute('href')
-                    text = link_element.text
-                    
-                    if href and text:
-                        links.append({
-                            'url': href,
-                            'text': text,
-                            'code': code_mandat
-                        })
-                except Exception as e:
-                    print(f"Erreur lors de l'extraction d'un lien: {e}")
-                    continue
-            
-            print(f"Nombre de mandats trouvés : {len(links)}")
-            
-            for index, link_data in enumerate(links, 1):
-                try:
-                    code_mandat = link_data['code']
-                    
-                    if code_mandat in self.processed_mandats:
-                        print(f"Mandat {code_mandat} déjà traité, passage au suivant...")
-                        continue
-                    
-                    print(f"\nTraitement du mandat {index}/{len(links)}: {link_data['text']}")
-                    
-                    # Ouvrir un nouvel onglet
-                    self.driver.execute_script("window.open('');")
-                    self.driver.switch_to.window(self.driver.window_handles[-1])
-                    
-                    # Charger la page du mandat
-                    self.driver.get(link_data['url'])
-                    time.sleep(0.5)
-                    
-                    # Vérifier si l'accès est bloqué avec plusieurs méthodes
-                    try:
-                        # Attendre un court instant pour que la page se charge
-                        time.sleep(0.5)
-                        
-                        # Essayer plusieurs méthodes pour détecter l'erreur
-                        error_detected = False
-                        ref_id = None
-                        
-                        # Méthode 1: Chercher le titre h3
-                        try:
-                            error_h3 = self.driver.find_element(By.XPATH, "//h3[contains(text(), 'avez pas accès')]")
-                            error_detected = True
-                            ref_id = error_h3.text.split("Ref.ID:")[-1].strip() if "Ref.ID:" in error_h3.text else None
-                        except:
-                            pass
-                        
-                        # Méthode 2: Chercher la div d'alerte
-                        if not error_detected:
-                            try:
-                                error_div = self.driver.find_element(By.CLASS_NAME, "t-Alert--danger")
-                                error_detected = True
-                                # Chercher le Ref.ID dans le texte de la div
-                                error_text = error_div.text
-                                if "Ref.ID:" in error_text:
-                                    ref_id = error_text.split("Ref.ID:")[-1].split("\n")[0].strip()
-                            except:
-                                pass
-                        
-                        # Méthode 3: Chercher par le texte exact
-                        if not error_detected:
-                            try:
-                                error_text = self.driver.find_element(By.XPATH, "//*[contains(text(), 'Accès refusé par le contrôle de sécurité')]")
-                                error_detected = True
-                            except:
-                                pass
-                        
-                        if error_detected:
-                            print(f"Accès refusé pour le mandat {code_mandat}" + (f" (Ref.ID: {ref_id})" if ref_id else "") + " - marqué comme non valide")
-                            
-                            error_data = {
-                                'code_mandat': code_mandat,
-                                'titre_mandat': link_data['text'],
-                                'url': link_data['url'],
-                                'etat_mandat': 'Non valide - Accès refusé',
-                                'date_verification': time.strftime('%Y-%m-%d %H:%M:%S')
-                            }
-                            
-                            if ref_id:
-                                error_data['ref_id'] = ref_id
-                            
-                            error_data['message_erreur'] = 'Accès refusé par le contrôle de sécurité de la page'
-                            
-                            # Sauvegarder le mandat comme non valide
-                            self.save_mandat(error_data)
-                            
-                            # Fermer l'onglet et continuer avec le prochain mandat
-                            self.driver.close()
-                            self.driver.switch_to.window(main_window)
-                            continue
-                            
-                    except Exception as e:
-                        print(f"Erreur lors de la vérification de l'accès: {str(e)}")
-                    
-                    # Si pas d'erreur d'accès, extraire les détails
-                    details = self.extract_mandat_details()
-                    
-                    if details:
-                        self.save_mandat(details)
-                        print(f"Mandat {code_mandat} sauvegardé avec succès")
-                    
-                    # Fermer l'onglet et revenir à l'onglet principal
-                    self.driver.close()
-                    self.driver.switch_to.window(main_window)
-                    
-                except Exception as e:
-                    print(f"Erreur lors du traitement du mandat {index}: {str(e)}")
-                    try:
-                        if len(self.driver.window_handles) > 1:
-                            self.driver.close()
-                        self.driver.switch_to.window(main_window)
-                    except:
-                        print("Erreur lors du retour à l'onglet principal")
-                    continue
-            
+            self.run_id = self.crawl_queue.unfinished_run() if self.resume else None
+            if self.run_id is not None:
+                pending = self.crawl_queue.pending(self.run_id)
+                print(f"Reprise du parcours n°{self.run_id}: {len(pending)} mandats restants")
+            else:
+                links, complete = self.harvest_links()
+                print(f"Nombre de mandats trouvés : {len(links)}")
+                
+                self.update_listing(links, complete)
+                pending = self.select_pending(links)
+                self.run_id = self.crawl_queue.start_run(pending)
+                self.resume = True
+            
+            # Chaque passe tente une fois chaque mandat restant; un mandat est
+            # abandonné après max_attempts échecs
+            for attempt in range(self.crawl_queue.max_attempts):
+                if not pending:
+                    break
+                if attempt:
+                    print(f"\nNouvelle tentative pour {len(pending)} mandats")
+                    if not self.relogin_if_expired():
+                        raise RuntimeError("reconnexion impossible")
+                self.extract_pending(pending)
+                pending = self.crawl_queue.pending(self.run_id)
+            
+            abandoned = self.crawl_queue.abandoned(self.run_id)
+            if abandoned:
+                print(f"{len(abandoned)} mandats abandonnés après {self.crawl_queue.max_attempts} tentatives: "
+                      + ", ".join(abandoned))
+            self.crawl_queue.finish_run(self.run_id)
+            self.timings.print_summary()
             return True
             
         except Exception as e:
             print(f"Erreur générale: {str(e)}")
+            if self.run_id is not None:
+                print(f"Le parcours n°{self.run_id} reprendra là où il s'est arrêté")
             return False
+
+    def extract_pending(self, pending):
+        """Extrait les mandats selon le mode configuré (HTTP, navigateurs en parallèle ou onglets)"""
+        workers = min(self.settings['workers'], self.settings['max_workers'])
         
-    def extract_mandat_details(self):
-        """Extrait les détails spécifiques d'un mandat"""
-        try:
-            wait = WebDriverWait(self.driver, 1)
-            details = {}
-            
-            def extract_after_label(label):
-                try:
-                    xpath = f"//label[contains(text(), '{label}')]/../..//span[contains(@class, 'display_only')]"
-                    element = wait.until(EC.presence_of_element_located((By.XPATH, xpath)))
-                    
-                    if element:
-                        return (element.get_attribute('innerText') or element.text).strip()
-                        
-                except:
-                    try:
-                        alt_xpath = f"//label[contains(text(), '{label}')]/../following-sibling::div//span"
-                        element = self.driver.find_element(By.XPATH, alt_xpath)
-                        if element:
-                            return (element.get_attribute('innerText') or element.text).strip()
-                    except:
-                        pass
-                return ''
-
-            # Vérifier si la postulation est sur LaRuche
+        # En mode HTTP, seuls les mandats non reconnus passent par le navigateur
+        if self.settings['fetch_mode'] == 'http' and pending:
+            pending = self.extract_http(pending, workers)
+        
+        if workers > 1 and len(pending) > 1:
+            self.extract_parallel(pending, workers)
+        else:
+            self.extract_serial(pending)
+
+    def update_listing(self, links, complete=True):
+        """Enregistre les mandats listés et ferme ceux qui ont disparu de la liste
+
+        Une liste incomplète (page suivante non chargée, limite de pages)
+        n'est pas utilisée pour fermer des mandats: ceux des pages non lues
+        n'ont pas disparu.
+        """
+        run_id = self.repository.start_listing_run()
+        self.repository.mark_listed(run_id, [link_data['code'] for link_data in links])
+        
+        if not complete:
+            print("Liste lue partiellement: aucun mandat marqué comme fermé")
+        # Une liste vide est plus probablement une erreur de chargement
+        elif links:
+            closed = self.repository.close_unlisted(run_id)
+            for code in closed:
+                print(f"Mandat {code} retiré de la liste - marqué comme fermé")
+
+    def select_pending(self, links):
+        """Choisit les mandats dont la page de détails doit être chargée"""
+        pending = []
+        
+        if self.settings['incremental']:
+            # Mode incrémental: seuls les mandats nouveaux ou dont la ligne a changé
+            fingerprints = self.repository.listing_fingerprints()
+            for link_data in links:
+                previous = fingerprints.get(link_data['code'])
+                if previous == link_data['fingerprint']:
+                    continue
+                if previous:
+                    print(f"Mandat {link_data['code']} modifié, nouvelle extraction")
+                pending.append(link_data)
+            print(f"{len(links) - len(pending)} mandats inchangés, {len(pending)} à extraire")
+            return pending
+        
+        for link_data in links:
+            if link_data['code'] in self.processed_mandats:
+                print(f"Mandat {link_data['code']} déjà traité, passage au suivant...")
+                continue
+            pending.append(link_data)
+        return pending
+
+    def store_result(self, link_data, record):
+        """Sauvegarde le résultat d'un mandat et l'empreinte de sa ligne de liste"""
+        if not record:
+            self.mark_failed(link_data, "page du mandat non extraite")
+            return
+        self.save_mandat(record)
+        if link_data.get('fingerprint'):
+            self.repository.set_fingerprint(link_data['code'], link_data['fingerprint'])
+        if self.run_id is not None:
+            self.crawl_queue.mark_done(self.run_id, link_data['code'])
+        print(f"Mandat {link_data['code']} sauvegardé avec succès")
+
+    def mark_failed(self, link_data, error):
+        """Compte un échec dans la file du parcours; le mandat sera réessayé"""
+        if self.run_id is not None:
+            self.crawl_queue.mark_failed(self.run_id, link_data['code'], error)
+
+    def extract_serial(self, links):
+        """Traite les mandats un par un dans un onglet du navigateur principal"""
+        main_window = self.driver.current_window_handle
+        
+        for index, link_data in enumerate(links, 1):
             try:
-                # Chercher les éléments caractéristiques de la postulation sur LaRuche
-                laruche_elements = [
-                    "//div[contains(text(), 'Le document doit être en format .PDF')]",
-                    "//label[contains(text(), 'Choisir un CV')]",
-                    "//label[contains(text(), 'Choisir une lettre')]"
-                ]
+                print(f"\nTraitement du mandat {index}/{len(links)}: {link_data['text']}")
                 
-                # Chercher les éléments caractéristiques d'une postulation externe
-                external_elements = [
-                    "//div[contains(text(), 'Instruction de postulation')]"
-                ]
+                # Ouvrir un nouvel onglet
+                self.driver.execute_script("window.open('');")
+                self.driver.switch_to.window(self.driver.window_handles[-1])
                 
-                is_laruche = any(
-                    self.driver.find_elements(By.XPATH, xpath)
-                    for xpath in laruche_elements
-                )
+                record = self.fetch_mandat(self.driver, link_data)
+                self.store_result(link_data, record)
                 
-                is_external = any(
-                    self.driver.find_elements(By.XPATH, xpath)
-                    for xpath in external_elements
-                )
+                # Fermer l'onglet et revenir à l'onglet principal
+                self.driver.close()
+                self.driver.switch_to.window(main_window)
                 
-                if is_laruche:
-                    details['postulation_laruche'] = 'Oui'
-                elif is_external:
-                    details['postulation_laruche'] = 'Non'
-                else:
-                    details['postulation_laruche'] = 'Non'
-                    
             except Exception as e:
-                print(f"Erreur lors de la vérification du type de postulation: {str(e)}")
-                details['postulation_laruche'] = 'Erreur de vérification'
-
-            # Mapping des champs (même que précédemment)
-            fields = {
-                'etat_mandat': 'État du mandat',
-                'date_limite': 'Date limite pour postuler',
-                'employeur': 'Employeur',
-                'description_employeur': 'Description de l\'employeur',
-                'site_web': 'Site Web',
-                'lieu_travail': 'Lieu du travail',
-                'mode_travail': 'Mode de travail',
-                'precisions_mode_travail': 'Précisions sur le mode de travail',
-                'code_mandat': 'Code du mandat',
-                'debut_mandat': 'Début du mandat',
-                'duree': 'Durée',
-                'possibilite_prolongation': 'Possibilité de prolongation',
-                'titre_mandat': 'Titre du mandat',
-                'description_mandat': 'Description du mandat',
-                'exigences_mandat': 'Exigences du mandat',
-                'niveau_etudes': 'Niveau d\'études requis',
-                'specialites': 'Spécialités'
+                print(f"Erreur lors du traitement du mandat {index}: {str(e)}")
+                self.mark_failed(link_data, str(e))
+                try:
+                    if len(self.driver.window_handles) > 1:
+                        self.driver.close()
+                    self.driver.switch_to.window(main_window)
+                except:
+                    print("Erreur lors du retour à l'onglet principal")
+                continue
+
+    def extract_parallel(self, links, workers):
+        """Traite les mandats avec un pool de navigateurs headless
+
+        Les navigateurs du pool reprennent les cookies de la connexion du
+        navigateur principal. Seul le thread principal écrit les mandats.
+        """
+        print(f"Extraction parallèle avec {workers} navigateurs")
+        pool = DriverPool(
+            size=workers,
+            cookies=self.driver.get_cookies(),
+            start_url=self.driver.current_url,
+            min_interval=self.settings['min_request_interval']
+        )
+        try:
+            for index, (link_data, record) in enumerate(pool.map(self.fetch_mandat, links), 1):
+                print(f"\nMandat {index}/{len(links)}: {link_data['text']}")
+                self.store_result(link_data, record)
+        finally:
+            pool.close()
+
+    def extract_http(self, links, workers):
+        """Traite les mandats par requêtes HTTP; renvoie ceux à extraire avec le navigateur"""
+        print(f"Extraction HTTP avec {workers} connexions")
+        fetcher = self.get_http_fetcher(workers)
+        fallback = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self.fetch_http, fetcher, link_data): link_data
+                for link_data in links
             }
+            for index, future in enumerate(as_completed(futures), 1):
+                link_data = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    print(f"Erreur HTTP pour le mandat {link_data['code']}: {str(e)}")
+                    record = None
+                
+                if record is None:
+                    fallback.append(link_data)
+                    continue
+                
+                print(f"\nMandat {index}/{len(links)}: {link_data['text']}")
+                self.store_result(link_data, record)
+        
+        if fallback:
+            print(f"{len(fallback)} mandats seront extraits avec le navigateur")
+        return fallback
+
+    def get_http_fetcher(self, workers):
+        """Client HTTP du navigateur connecté, créé une fois puis réutilisé"""
+        if self.http_fetcher is None or self.http_fetcher.pool_size < workers:
+            if self.http_fetcher:
+                self.http_fetcher.close()
+            self.http_fetcher = HttpMandatFetcher.from_driver(
+                self.driver,
+                pool_size=workers,
+                throttle=RequestThrottle(self.settings['min_request_interval'])
+            )
+            self.http_fetcher.session_generation = self.session.generation
+        return self.http_fetcher
 
-            # Extraire tous les champs
-            for field, label in fields.items():
-                details[field] = self.clean_text(extract_after_label(label))
+    def fetch_http(self, fetcher, link_data):
+        with self.timings.measure('http_fetch', code_mandat=link_data['code']):
+            # Une reconnexion au plus par mandat si la session expire
+            for attempt in range(2):
+                generation = self.session.generation
+                if fetcher.session_generation != generation:
+                    fetcher.load_cookies(self.session.cookies)
+                    fetcher.session_generation = generation
+                try:
+                    return fetcher.fetch(dict(link_data, url=self.session.session_url(link_data['url'])),
+                                         self.clean_text)
+                except SessionExpired:
+                    if attempt or not self.session.renew(generation):
+                        print(f"Session expirée pour le mandat {link_data['code']}")
+                        return None
 
-            # Cas spécial pour le site web
-            try:
-                site_web_xpath = "//label[contains(text(), 'Site Web')]/../following-sibling::div//a"
-                site_web_element = self.driver.find_element(By.XPATH, site_web_xpath)
-                if site_web_element:
-                    details['site_web'] = site_web_element.get_attribute('href')
-            except:
-                pass
-
-            details['url'] = self.driver.current_url
+    def fetch_mandat(self, driver, link_data):
+        """Charge la page d'un mandat et renvoie les données à sauvegarder"""
+        code_mandat = link_data['code']
+        self.session.sync_driver(driver)
+        
+        for attempt in range(2):
+            generation = self.session.generation
+            
+            # Charger la page du mandat et attendre qu'elle soit au repos
+            with self.timings.measure('page_load', code_mandat=code_mandat):
+                driver.get(self.session.session_url(link_data['url']))
+                if not page_ready.wait_for_mandat_page(driver, self.wait_time):
+                    print(f"Page du mandat {code_mandat} incomplète après {self.wait_time}s")
+            
+            # Un seul instantané de la page, analysé localement
+            tree = mandat_parser.parse_html(driver.page_source)
+            if not self.session.is_expired(tree, driver.current_url):
+                break
+            
+            # Session expirée: un seul worker se reconnecte, les autres reprennent ses cookies
+            if attempt or not self.session.renew(generation):
+                print(f"Session expirée pour le mandat {code_mandat}")
+                return None
+            self.session.sync_driver(driver)
+        
+        try:
+            error_detected, ref_id = mandat_parser.detect_access_denied(tree)
+            
+            if error_detected:
+                print(f"Accès refusé pour le mandat {code_mandat}" + (f" (Ref.ID: {ref_id})" if ref_id else "") + " - marqué comme non valide")
+                
+                # Le mandat sera sauvegardé comme non valide
+                return mandat_parser.access_denied_record(link_data, ref_id)
+                
+        except Exception as e:
+            print(f"Erreur lors de la vérification de l'accès: {str(e)}")
+        
+        # Si pas d'erreur d'accès, extraire les détails
+        return self.extract_mandat_details(driver, tree)
+        
+    def extract_mandat_details(self, driver=None, tree=None):
+        """Extrait les détails spécifiques d'un mandat à partir d'un instantané de la page"""
+        driver = driver or self.driver
+        try:
+            start = time.perf_counter()
+            
+            # Une seule lecture du DOM au lieu d'une requête WebDriver par libellé
+            if tree is None:
+                tree = mandat_parser.parse_html(driver.page_source)
+            details = mandat_parser.extract_details(tree, driver.current_url, self.clean_text)
+            
+            elapsed = time.perf_counter() - start
+            self.timings.record('extraction', elapsed, code_mandat=details.get('code_mandat'))
+            print(f"Détails extraits en {elapsed * 1000:.0f} ms")
             return details
 
+        except mandat_parser.UnexpectedLayout as e:
+            print(f"Page du mandat non reconnue: {e}")
+            return {}
         except Exception as e:
             print(f"Erreur lors de l'extraction des détails: {str(e)}")
             return {}
@@ -395,24 +490,16 @@ class PortalScraper:
         return data
 
     def save_mandat(self, mandat_data):
-        """Sauvegarde un mandat dans le fichier JSON"""
+        """Ajoute un mandat au fichier JSONL"""
+        with self.timings.measure('save', code_mandat=mandat_data.get('code_mandat')):
+            self._save_mandat(mandat_data)
+
+    def _save_mandat(self, mandat_data):
         try:
-            try:
-                with open(self.mandats_file, 'r', encoding='utf-8') as f:
-                    mandats = json.load(f)
-            except FileNotFoundError:
-                mandats = []
-            except json.JSONDecodeError:
-                print("Erreur de décodage JSON, création d'un nouveau fichier")
-                mandats = []
-            
             # Nettoyer les données avant la sauvegarde
             cleaned_data = self.clean_dict(mandat_data)
             
-            mandats.append(cleaned_data)
-            
-            with open(self.mandats_file, 'w', encoding='utf-8') as f:
-                json.dump(mandats, f, ensure_ascii=False, indent=2)
+            self.store.append(cleaned_data)
             
             self.processed_mandats.add(cleaned_data.get('code_mandat', ''))
             
@@ -420,68 +507,41 @@ class PortalScraper:
             
         except Exception as e:
             print(f"Erreur lors de la sauvegarde du mandat: {str(e)}")
+
     def clean_existing_json(self):
-        """Nettoie le fichier JSON existant"""
+        """Nettoie et compacte le fichier de mandats existant"""
         try:
-            with open(self.mandats_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            # Nettoyer les données
-            cleaned_data = self.clean_dict(data)
-            
-            # Sauvegarder les données nettoyées
-            with open(self.mandats_file, 'w', encoding='utf-8') as f:
-                json.dump(cleaned_data, f, ensure_ascii=False, indent=2)
-                
-            print("Nettoyage du fichier JSON terminé")
+            count = self.store.compact(transform=self.clean_dict)
+            print(f"Nettoyage du fichier {self.store.path} terminé ({count} mandats)")
             
         except Exception as e:
-            print(f"Erreur lors du nettoyage du fichier JSON: {str(e)}")
+            print(f"Erreur lors du nettoyage du fichier de mandats: {str(e)}")
 
     def clean_text(self, text):
-        """Nettoie le texte des problèmes d'encodage multiples"""
-        if not isinstance(text, str):
-            return text
-            
-        try:
-            # Décoder les HTML entities
-            text = html.unescape(text)
-            
-            # Essayer de corriger l'encodage
-            encodings = ['utf-8', 'latin1', 'iso-8859-1']
-            for enc in encodings:
-                try:
-                    text = text.encode(enc).decode('utf-8')
-                    break
-                except:
-                    continue
-            
-            # Nettoyer les espaces et caractères de contrôle
-            text = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', text)
-            text = re.sub(r'\s+', ' ', text)
-            
-            return text.strip()
-            
-        except Exception as e:
-            print(f"Erreur lors du nettoyage du texte: {str(e)}")
-            return text
+        """Nettoie le texte: entités HTML, mojibake, caractères de contrôle et espaces (voir text_normalize)"""
+        return clean_portal_text(text)
 
 def main():
+    parser = argparse.ArgumentParser(description="Extrait les mandats du portail LaRuche")
+    parser.add_argument('--recommencer', action='store_true',
+                        help="Ignore le parcours interrompu et relit la liste des mandats")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.setup(args)
+
     scraper = PortalScraper()
+    scraper.resume = not args.recommencer
     try:
         scraper.setup_driver()
-        if scraper.login():
-            print("Connexion réussie! Début de l'extraction des mandats...")
-            scraper.extract_mandats()
-            print("Extraction terminée. Appuyez sur 'q' et Enter pour quitter.")
-            while input().lower() != 'q':
-                pass
+        if scraper.crawl():
+            print("Extraction terminée.")
         else:
-            print("Échec de la connexion")
+            print("Extraction interrompue; relancer le script pour reprendre le parcours")
     except Exception as e:
         print(f"Une erreur est survenue: {e}")
     finally:
         scraper.close()
+        instrumentation.finish(args, scraper.timings, 'scraper')
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
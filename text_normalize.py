@@ -0,0 +1,93 @@
+"""Normalisation des textes du portail et des lettres
+
+Les motifs sont compilés une fois. Les libellés courts du portail (état,
+mode de travail, lieu...) se répètent d'un mandat à l'autre: leur nettoyage
+est mémorisé. Les longs textes, presque toujours uniques, ne le sont pas.
+
+Mesure (bench/bench_clean_text.py): str.translate avec une table de
+correspondance parcourt le texte caractère par caractère en Python et est
+bien plus lent que quelques str.replace ou une expression compilée; il
+n'est donc pas utilisé ici.
+"""
+import html
+import re
+from functools import lru_cache
+
+# Octets de continuation UTF-8 (0x80-0xBF) tels qu'affichés en CP1252/Latin-1
+_CONTINUATION = ('\u0080-\u00bf\u0152\u0153\u0160\u0161\u0178\u017d\u017e\u0192\u02c6\u02dc'
+                 '\u2013\u2014\u2018-\u201a\u201c-\u201e\u2020-\u2022\u2026\u2030\u2039\u203a\u20ac\u2122')
+# Séquences UTF-8 relues en CP1252/Latin-1 (Ã©, Ã¨, â€™...), longueur selon l'octet de tête;
+# un « Ã » suivi d'un espace ordinaire est un « à » dont l'espace insécable a été normalisé
+MOJIBAKE_RE = re.compile(f'[\u00c2-\u00df][{_CONTINUATION}]'
+                         f'|[\u00e0-\u00ef][{_CONTINUATION}]{{2}}'
+                         f'|[\u00f0-\u00f4][{_CONTINUATION}]{{3}}'
+                         f'|\u00c3(?= )')
+
+# Caractères de contrôle C0/C1 supprimés; ceux qui séparent des mots (\t, \n, \r, \x85...)
+# sont des espaces pour str.split()
+CONTROL_RE = re.compile('[\x00-\x08\x0e-\x1b\x7f-\x84\x86-\x9f]')
+
+# Caractères typographiques remplacés pour le rendu PDF
+PDF_REPLACEMENTS = (
+    ('\u2013', '-'),
+    ('\u2014', '-'),
+    ('\u2018', "'"),
+    ('\u2019', "'"),
+    ('\u201c', '"'),
+    ('\u201d', '"'),
+    ('\u2026', '...'),
+    ('\u00a0', ' '),
+    ('\u202f', ' '),
+)
+
+# Au-delà de cette longueur, un texte est presque toujours unique: pas de mémorisation
+MEMO_MAX_LENGTH = 200
+
+
+def _decode_sequence(match) -> str:
+    sequence = match.group(0)
+    if sequence == '\u00c3':
+        return '\u00e0'
+    for encoding in ('cp1252', 'latin-1'):
+        try:
+            return sequence.encode(encoding).decode('utf-8')
+        except UnicodeError:
+            continue
+    return sequence
+
+
+def fix_mojibake(text: str) -> str:
+    """Répare les séquences UTF-8 décodées à tort en CP1252/Latin-1; le reste du texte est inchangé"""
+    # Le français mal décodé contient presque toujours Ã (é, è, à...), Â (espaces, «») ou â€ (’, –)
+    if '\u00c3' not in text and '\u00c2' not in text and '\u00e2\u20ac' not in text:
+        return text
+    return MOJIBAKE_RE.sub(_decode_sequence, text)
+
+
+def _clean(text: str) -> str:
+    if '&' in text:
+        text = html.unescape(text)
+    if not text.isascii():
+        text = fix_mojibake(text)
+    text = CONTROL_RE.sub('', text)
+    # split() sans argument coupe sur toute suite d'espaces Unicode et ignore ceux des bords
+    return ' '.join(text.split())
+
+
+_clean_memo = lru_cache(maxsize=65536)(_clean)
+
+
+def clean_portal_text(text):
+    """Texte du portail: entités HTML, mojibake, caractères de contrôle et espaces multiples"""
+    if not isinstance(text, str):
+        return text
+    if len(text) <= MEMO_MAX_LENGTH:
+        return _clean_memo(text)
+    return _clean(text)
+
+
+def clean_pdf_text(text: str) -> str:
+    """Remplace la typographie non gérée par la police du PDF (tirets, guillemets, points de suspension)"""
+    for old, new in PDF_REPLACEMENTS:
+        text = text.replace(old, new)
+    return text